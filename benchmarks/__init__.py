@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+"""
+Performance benchmarks of encoders: wall time and peak memory of fit, transform, fit_transform, save and load.
+
+Suites follow the airspeed velocity (asv) conventions, see asv.conf.json, and can also be run without asv:
+
+    python -m benchmarks --quick --output results.json
+    python -m benchmarks --output new.json --compare results.json
+"""
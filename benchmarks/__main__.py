@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+Standalone runner of benchmark suites, for environments without asv.
+
+Wall time is the best of several runs. Peak memory is the peak of memory allocated during the call, traced with
+tracemalloc (numpy arrays included), on top of memory already allocated by setup. Results are written as JSON, one
+record per benchmark and parameter combination, and can be compared with those of another run (e.g. of a release).
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import argparse
+import inspect
+import itertools
+import json
+import platform
+import re
+import subprocess
+import sys
+import timeit
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+from benchmarks import bench_encoders
+
+UNITS = {'time': 'seconds', 'peakmem': 'bytes'}
+
+
+def suites():
+    """Benchmark classes, in order of definition."""
+    classes = [cls for name, cls in inspect.getmembers(bench_encoders, inspect.isclass)
+               if not name.startswith('_') and hasattr(cls, 'params') and cls.__module__ == bench_encoders.__name__]
+    return sorted(classes, key=lambda cls: inspect.getsourcelines(cls)[1])
+
+
+def measure(func, kind, repeat):
+    if kind == 'time':
+        timings = []
+        for _ in range(repeat):
+            start = timeit.default_timer()
+            func()
+            timings.append(timeit.default_timer() - start)
+        return min(timings)
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run(pattern=None, quick=False, repeat=3):
+    """Run benchmarks whose name `<Suite>.<method>` matches pattern, over all parameter combinations.
+
+    :param str pattern: regular expression, None to run all benchmarks
+    :param bool quick: if True, only the first value of each parameter but the encoder is used
+    :param int repeat: number of runs of time benchmarks, the best one being kept
+
+    :return: records {name, params, value, unit}
+    :rtype: [dict]
+    """
+    records = []
+    for cls in suites():
+        methods = [name for name in sorted(dir(cls)) if name.split('_')[0] in UNITS
+                   and (pattern is None or re.search(pattern, '{}.{}'.format(cls.__name__, name)))]
+        if not methods:
+            continue
+        params = [values[:1] if quick and i > 0 else values for i, values in enumerate(cls.params)]
+        for combination in itertools.product(*params):
+            benchmark = cls()
+            benchmark.setup(*combination)
+            try:
+                for name in methods:
+                    kind = name.split('_')[0]
+                    value = measure(lambda: getattr(benchmark, name)(*combination), kind, repeat)
+                    records.append({'name': '{}.{}'.format(cls.__name__, name),
+                                    'params': dict(zip(cls.param_names, combination)),
+                                    'value': value, 'unit': UNITS[kind]})
+                    print('{:<40} {:<70} {}'.format(records[-1]['name'], _params_key(records[-1]),
+                                                    _format(value, UNITS[kind])))
+            finally:
+                if hasattr(benchmark, 'teardown'):
+                    benchmark.teardown(*combination)
+    return records
+
+
+def environment():
+    """Versions and machine on which benchmarks ran, for results to be compared knowingly."""
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.STDOUT).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'machine': platform.machine(),
+        'system': platform.platform(),
+    }
+
+
+def compare(records, baseline_records, factor):
+    """Print ratios of values to those of a baseline run, flagging changes beyond factor.
+
+    :return: number of regressions
+    :rtype: int
+    """
+    baseline = {(record['name'], _params_key(record)): record['value'] for record in baseline_records}
+    regressions = 0
+    for record in records:
+        before = baseline.get((record['name'], _params_key(record)))
+        if not before:
+            continue
+        ratio = record['value'] / before
+        flag = '+' if ratio > factor else '-' if ratio < 1 / factor else ' '
+        regressions += flag == '+'
+        print('{} {:<40} {:<70} {} -> {} ({:.2f}x)'.format(
+            flag, record['name'], _params_key(record), _format(before, record['unit']),
+            _format(record['value'], record['unit']), ratio))
+    return regressions
+
+
+def _params_key(record):
+    return ', '.join('{}={}'.format(k, v) for k, v in sorted(record['params'].items()))
+
+
+def _format(value, unit):
+    if unit == 'seconds':
+        return '{:.4g}s'.format(value)
+    return '{:.4g}MB'.format(value / 2 ** 20)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__)
+    parser.add_argument('--filter', help='regular expression on benchmark names, e.g. "Rows.time_"')
+    parser.add_argument('--quick', action='store_true', help='only the first value of parameters but the encoder')
+    parser.add_argument('--repeat', type=int, default=3, help='runs of time benchmarks, the best one is kept')
+    parser.add_argument('--output', help='JSON file where results are written')
+    parser.add_argument('--compare', help='JSON file of a previous run, to compare results with')
+    parser.add_argument('--factor', type=float, default=1.1, help='ratio beyond which a change is flagged')
+    args = parser.parse_args(argv)
+
+    records = run(args.filter, args.quick, args.repeat)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'environment': environment(), 'results': records}, f, indent=1, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print('\nCompared with {}:'.format(baseline['environment'].get('commit')))
+        if compare(records, baseline['results'], args.factor):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
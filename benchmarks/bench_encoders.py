@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark suites. Methods prefixed with `time_` measure wall time, those prefixed with `peakmem_` peak memory.
+
+Default parameters are sized for a laptop; set MLENCODERS_BENCHMARK_LARGE=1 to add 1e8 rows and 1e7 categories.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+from benchmarks.data import make_frame
+
+from mlencoders.label_encoder import LabelEncoder
+from mlencoders.target_encoder import TargetEncoder
+from mlencoders.weight_of_evidence_encoder import WeightOfEvidenceEncoder
+
+ENCODERS = {
+    'target': TargetEncoder,
+    'woe': WeightOfEvidenceEncoder,
+    'label': LabelEncoder,
+}
+LARGE = os.environ.get('MLENCODERS_BENCHMARK_LARGE') == '1'
+
+
+class _EncoderBenchmark(object):
+    """Fit and transform of one encoder on a synthetic frame, built by `setup` from parameters."""
+
+    frame_params = {}
+
+    def setup(self, encoder, *params):
+        kwargs = dict(self.frame_params, **dict(zip(self.param_names[1:], params)))
+        self.X, self.y = make_frame(**kwargs)
+        self.encoder_class = ENCODERS[encoder]
+        self.fitted = self.encoder_class()
+        self.fitted.fit(self.X, self.y)
+
+    def time_fit(self, *params):
+        self.encoder_class().fit(self.X, self.y)
+
+    def peakmem_fit(self, *params):
+        self.encoder_class().fit(self.X, self.y)
+
+    def time_transform(self, *params):
+        self.fitted.transform(self.X)
+
+    def peakmem_transform(self, *params):
+        self.fitted.transform(self.X)
+
+    def time_fit_transform(self, *params):
+        self.encoder_class().fit_transform(self.X, self.y)
+
+    def peakmem_fit_transform(self, *params):
+        self.encoder_class().fit_transform(self.X, self.y)
+
+
+class Rows(_EncoderBenchmark):
+    params = (sorted(ENCODERS), [10 ** 4, 10 ** 6] + ([10 ** 8] if LARGE else []), ['object', 'category', 'int'])
+    param_names = ['encoder', 'n_rows', 'dtype']
+    frame_params = {'cardinality': 1000}
+
+
+class Cardinality(_EncoderBenchmark):
+    params = (sorted(ENCODERS), [10, 10 ** 3, 10 ** 5] + ([10 ** 7] if LARGE else []))
+    param_names = ['encoder', 'cardinality']
+    frame_params = {'n_rows': 10 ** 6 if not LARGE else 10 ** 7}
+
+
+class Columns(_EncoderBenchmark):
+    params = (sorted(ENCODERS), [1, 10, 50])
+    param_names = ['encoder', 'n_cols']
+    frame_params = {'n_rows': 10 ** 5, 'cardinality': 1000}
+
+
+class WideFrame(object):
+    """Transform of a frame of many integer columns, half of them encoded: all columns share a single block."""
+
+    params = (sorted(ENCODERS), [200])
+    param_names = ['encoder', 'n_cols']
+
+    def setup(self, encoder, n_cols):
+        rng = np.random.RandomState(0)
+        self.X = pd.DataFrame(rng.randint(0, 100, (10 ** 5, n_cols)), columns=['c{}'.format(i) for i in range(n_cols)])
+        self.fitted = ENCODERS[encoder](cols=list(self.X.columns[::2]))
+        self.fitted.fit(self.X, pd.Series(rng.random_sample(10 ** 5) < 0.3, dtype=np.int64))
+
+    def time_transform(self, *params):
+        self.fitted.transform(self.X)
+
+    def peakmem_transform(self, *params):
+        self.fitted.transform(self.X)
+
+
+class MissingValues(_EncoderBenchmark):
+    params = (sorted(ENCODERS), [0., 0.1, 0.5], ['object', 'int'])
+    param_names = ['encoder', 'nan_rate', 'dtype']
+    frame_params = {'n_rows': 10 ** 6, 'cardinality': 1000}
+
+
+class Persistence(object):
+    """Saving and loading a fitted encoder, as a pickled object file or as npy files."""
+
+    params = (sorted(ENCODERS), [10 ** 3, 10 ** 6], ['object_file', 'npy_files'])
+    param_names = ['encoder', 'cardinality', 'format']
+
+    def setup(self, encoder, cardinality, file_format):
+        X, y = make_frame(n_rows=2 * cardinality, n_cols=5, cardinality=cardinality)
+        self.encoder_class = ENCODERS[encoder]
+        self.fitted = self.encoder_class()
+        self.fitted.fit(X, y)
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'encoder')
+        self.file_format = file_format
+        self._save(self.fitted)
+
+    def teardown(self, *params):
+        shutil.rmtree(self.directory)
+
+    def _save(self, encoder):
+        if self.file_format == 'object_file':
+            encoder.save_as_object_file(self.path)
+        else:
+            encoder.save_as_npy_files(self.path)
+
+    def _load(self):
+        encoder = self.encoder_class()
+        if self.file_format == 'object_file':
+            encoder.load_from_object_file(self.path)
+        else:
+            # Memory-mapped arrays are read by a first transform, not at loading time
+            encoder.load_from_npy_files(self.path, mmap_mode=None)
+        return encoder
+
+    def time_save(self, *params):
+        self._save(self.fitted)
+
+    def peakmem_save(self, *params):
+        self._save(self.fitted)
+
+    def time_load(self, *params):
+        self._load()
+
+    def peakmem_load(self, *params):
+        self._load()
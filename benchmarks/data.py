@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import numpy as np
+import pandas as pd
+
+
+def make_frame(n_rows, n_cols=1, cardinality=100, nan_rate=0., dtype='object', seed=0):
+    """Synthetic categorical features and binary target.
+
+    Categories are drawn from a Zipf-like distribution, so that a few categories are frequent and most are rare.
+
+    :param int n_rows: number of samples
+    :param int n_cols: number of categorical columns, named `cat0`, `cat1`...
+    :param int cardinality: number of distinct categories per column
+    :param float nan_rate: fraction of missing values in each column
+    :param str dtype: dtype of columns, 'object' (strings), 'category' or 'int'
+    :param int seed: random seed
+
+    :return: features, shape (n_rows, n_cols), and target, shape (n_rows,)
+    :rtype: (pandas.DataFrame, pandas.Series)
+    """
+    rng = np.random.RandomState(seed)
+    weights = 1. / np.arange(1, cardinality + 1)
+    cumulative = np.cumsum(weights / weights.sum())
+    columns = {}
+    for i in range(n_cols):
+        codes = np.minimum(np.searchsorted(cumulative, rng.random_sample(n_rows)), cardinality - 1)
+        missing = rng.random_sample(n_rows) < nan_rate if nan_rate else None
+        if dtype == 'int':
+            values = codes.astype(np.float64 if missing is not None else np.int64)
+        else:
+            values = np.array(['c{}'.format(code) for code in range(cardinality)], dtype=object).take(codes)
+        if missing is not None:
+            values[missing] = np.nan
+        columns['cat{}'.format(i)] = pd.Series(values, dtype='category' if dtype == 'category' else None)
+    X = pd.DataFrame(columns, columns=['cat{}'.format(i) for i in range(n_cols)])
+    y = pd.Series(rng.random_sample(n_rows) < 0.3, dtype=np.int64)
+    return X, y
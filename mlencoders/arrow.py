@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+Apache Arrow inputs and outputs, pyarrow being an optional dependency.
+
+Arrow string columns are dictionary-encoded by Arrow, and dictionary-encoded columns are handed to encoders as pandas
+categoricals built from their indices, so that values are never materialized as Python objects.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:
+    pa = None
+    pc = None
+
+
+def is_arrow(data):
+    """Whether data is an Arrow table, record batch, array or chunked array.
+
+    :rtype: bool
+    """
+    return pa is not None and isinstance(data, (pa.Table, pa.RecordBatch, pa.Array, pa.ChunkedArray))
+
+
+def to_series(column, name=None):
+    """Arrow column as a pandas Series, string and dictionary-encoded columns as categoricals.
+
+    :param column: pyarrow.Array or pyarrow.ChunkedArray
+    :param str name: name of the Series
+
+    :rtype: pandas.Series
+    """
+    if pa.types.is_string(column.type) or pa.types.is_large_string(column.type) or pa.types.is_binary(column.type):
+        column = pc.dictionary_encode(column)
+    # Dictionary arrays are converted from their indices, dictionaries of chunks being unified
+    return pd.Series(column.to_pandas(), name=name)
+
+
+def to_frame(table, cols=None):
+    """Given columns of an Arrow table or record batch as a pandas DataFrame (see `to_series`).
+
+    :param table: pyarrow.Table or pyarrow.RecordBatch
+    :param [str] cols: columns to convert, None for all columns
+
+    :rtype: pandas.DataFrame
+    """
+    names = table.schema.names if cols is None else list(cols)
+    columns = [to_series(table.column(table.schema.get_field_index(name)), name) for name in names]
+    return pd.DataFrame(dict(zip(names, columns)), columns=names)
+
+
+def replace_columns(table, replacements):
+    """Copy of an Arrow table or record batch, with some columns replaced. Other columns are not copied.
+
+    :param table: pyarrow.Table or pyarrow.RecordBatch
+    :param dict replacements: {column name: [(new name, numpy.ndarray or pandas array), ...]}, each column being
+        replaced with one or several arrays, in its place
+
+    :rtype: pyarrow.Table or pyarrow.RecordBatch, same as table
+    """
+    names, arrays = [], []
+    for i, name in enumerate(table.schema.names):
+        if name not in replacements:
+            names.append(name)
+            arrays.append(table.column(i))
+            continue
+        for new_name, values in replacements[name]:
+            names.append(new_name)
+            arrays.append(_to_array(values))
+    return type(table).from_arrays(arrays, names=names)
+
+
+def _to_array(values):
+    if isinstance(values, pd.Categorical):
+        categories = values.categories
+        if pd.api.types.infer_dtype(categories) in ('mixed', 'mixed-integer'):
+            # Arrow dictionaries hold values of a single type, unlike e.g. strings and NAN_CATEGORY
+            categories = categories.astype(str)
+        return pa.DictionaryArray.from_arrays(pa.array(values.codes, mask=values.codes == -1), pa.array(categories))
+    # Numeric arrays are wrapped without copy, pandas nullable arrays are converted with their missing values
+    return pa.array(values)
+
+
+def iter_parquet(path, target=None, columns=None, batch_size=2 ** 16):
+    """Record batches of a Parquet file or dataset directory, read one at a time, e.g. for `fit_from_iterator`.
+
+    :param str path: Parquet file or directory of Parquet files
+    :param str target: name of the target column, None if there is none
+    :param [str] columns: feature columns to read, None for all columns
+    :param int batch_size: maximum number of rows of each batch
+
+    :return: record batches of features, or (features, target) tuples if target is given
+    :rtype: iterator
+    """
+    if pa is None:
+        raise ImportError('pyarrow is required to read Parquet files.')
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(path, format='parquet')
+    read = None if columns is None else list(columns) + ([target] if target is not None else [])
+    for batch in dataset.to_batches(columns=read, batch_size=batch_size):
+        if target is None:
+            yield batch
+            continue
+        features = [i for i, name in enumerate(batch.schema.names) if name != target]
+        X = pa.RecordBatch.from_arrays([batch.column(i) for i in features],
+                                       names=[batch.schema.names[i] for i in features])
+        yield X, batch.column(batch.schema.get_field_index(target))
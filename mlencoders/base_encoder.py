@@ -4,6 +4,11 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import copy
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import cpu_count
 
 try:
     import cPickle as pickle
@@ -11,64 +16,793 @@ except ImportError:
     import pickle
 
 import numpy as np
+import pandas as pd
 
-NAN_CATEGORY = -99999
+from mlencoders import arrow
+from mlencoders import matrix
+from mlencoders import streaming
+from mlencoders.category_mapping import CategoryMapping
+from mlencoders.category_mapping import NAN_CATEGORY
+from mlencoders.category_mapping import OTHER_CATEGORY
+from mlencoders.instrumentation import Instrumentation
+from mlencoders.instrumentation import NO_INSTRUMENTATION
+from mlencoders.lazy_mapping import LazyMapping
+from mlencoders.lazy_mapping import load_column
+from mlencoders.transform_cache import fingerprint
+from mlencoders.transform_cache import TransformCache
+
+# Version of the format written by `save_as_npy_files`, to be increased on any incompatible change
+NPY_FORMAT_VERSION = 3
+# Hash of missing values, as given by pandas for object and categorical columns
+MISSING_HASH = np.uint64(2 ** 64 - 1)
+
+
+def map_columns(func, cols, n_jobs=1):
+    """Apply func to each column name, spreading columns over `n_jobs` threads. Results keep the order of cols."""
+    n_jobs = cpu_count() if n_jobs in (None, -1) else n_jobs
+    if n_jobs <= 1 or len(cols) <= 1:
+        return [func(col) for col in cols]
+    with ThreadPoolExecutor(max_workers=min(n_jobs, len(cols))) as executor:
+        return list(executor.map(func, cols))
+
+
+def replace_columns(X, replacements):
+    """Copy of a DataFrame, with some columns replaced. Other columns are shared with X, not copied.
+
+    The output is built at once from column arrays: setting columns one by one would copy the whole block of columns of
+    the same dtype at each of them.
+
+    :param pandas.DataFrame X: DataFrame whose columns are replaced
+    :param dict replacements: {column name: [(new name, numpy.ndarray or pandas array), ...]}, each column being
+        replaced with one or several arrays, in its place
+
+    :rtype: pandas.DataFrame
+    """
+    names, arrays = [], []
+    for i, name in enumerate(X.columns):
+        if name in replacements:
+            items = replacements[name]
+        else:
+            column = X.iloc[:, i]
+            items = [(name, column.array if pd.api.types.is_extension_array_dtype(column.dtype) else column.values)]
+        names.extend(name for name, _ in items)
+        arrays.extend(values for _, values in items)
+    # Positions as keys, names may be duplicated
+    X_replaced = pd.DataFrame(dict(enumerate(arrays)), index=X.index, copy=False)
+    X_replaced.columns = pd.Index(names, name=X.columns.name)
+    return X_replaced
 
 
 class BaseEncoder(object):
 
-    def __init__(self, cols, handle_unseen, min_samples, imputed):
+    def __init__(self, cols, handle_unseen, min_samples, imputed, n_jobs=1, dtype=None, max_categories=None,
+                 min_frequency=None, n_buckets=None):
+        if n_buckets is not None and (max_categories is not None or min_frequency is not None):
+            raise ValueError('Rare categories cannot be folded with hashed encoding (n_buckets).')
         self.cols = cols
         self.handle_unseen = handle_unseen
         self.min_samples = max(1, min_samples)
+        self.n_jobs = n_jobs
+        # Name of the dtype of encoded columns, None to let the encoder pick it
+        self.dtype = None if dtype is None else np.dtype(dtype).name
+        # Bounds of mapping size, less frequent categories being folded into OTHER_CATEGORY
+        self.max_categories = max_categories
+        self.min_frequency = min_frequency
+        # Number of buckets categories are hashed into, None to keep a mapping of exact categories
+        self.n_buckets = n_buckets
         # In case of unseen value or not enough data to learn the mapping, we use this value for imputation
         self._imputed = imputed
-        # dict {str: pandas.DataFrame} column name --> mapping from category (index of df) to value (column of df)
+        # Names of targets when several are learnt at once (one encoded column each), None for a single target
+        self._targets = None
+        # dict {str: CategoryMapping} column name --> mapping from categories to values (and statistics if any)
         self._mapping = {}
+        # dict {str: CategoryMapping} column name --> statistics of all categories, before folding. Only kept when
+        # categories are folded, so that later chunks and merges fold them as a single fit would.
+        self._unfolded = {}
+        self._instrumentation = NO_INSTRUMENTATION
+        # Cache of encoded columns (see `cache_transforms`), and version of mappings, increased on any change of them
+        self._transform_cache = None
+        self._mapping_version = 0
+
+    def instrument(self, callback=None, enabled=True):
+        """Enable (or disable) measurements of fit and transform calls, available in `stats_` after each call.
+
+        When disabled, which is the default, measurements cost nothing.
+
+        :param callable callback: function called with each record as it is made, e.g. to send it to a metrics system
+        :param bool enabled: False to disable measurements
+
+        :return: None
+        """
+        self._instrumentation = Instrumentation(callback) if enabled else NO_INSTRUMENTATION
+
+    @property
+    def stats_(self):
+        """Measurements of the last fit or transform call, if instrumented (see `instrument`).
+
+        One record per column and phase (e.g. 'factorize', 'accumulate', 'lookup', 'take'), and one for the whole call
+        (phase 'total', column None), with keys: method, column, phase, seconds, rows, categories (seen at fitting time,
+        in the mapping at transform time), unseen (rows of unseen categories), bytes (allocated arrays).
+        `pandas.DataFrame(enc.stats_)` gives a table of them.
+
+        :rtype: [dict]
+        """
+        return list(self._instrumentation.records)
+
+    def cache_transforms(self, max_bytes=2 ** 28, enabled=True):
+        """Enable (or disable) caching of encoded columns, for transform calls on columns already encoded.
 
-    def transform(self, X):
+        Columns are identified by a fingerprint of their content, computed at each call, which is cheaper than encoding
+        them again. Cached columns are dropped whenever mappings change (fitting, loading or updating the encoder).
+
+        :param int max_bytes: maximum total size of cached columns, least recently used ones being evicted beyond it
+        :param bool enabled: False to disable caching, and drop cached columns
+
+        :return: None
+        """
+        self._transform_cache = TransformCache(max_bytes) if enabled else None
+
+    @property
+    def transform_cache_info(self):
+        """Usage of the transform cache (see `cache_transforms`), None if disabled.
+
+        :return: {'hits', 'misses', 'entries', 'bytes', 'max_bytes'}, counts of columns found and not found in the
+            cache, and its number of columns and size
+        :rtype: dict
+        """
+        cache = self._transform_cache
+        if cache is None:
+            return None
+        return {'hits': cache.hits, 'misses': cache.misses, 'entries': len(cache), 'bytes': cache.nbytes,
+                'max_bytes': cache.max_bytes}
+
+    def transform(self, X, copy=True, cols=None):
         """Transform categorical data based on mapping learnt at fitting time.
 
         :param pandas.DataFrame X: DataFrame of features, shape (n_samples, n_features). Must contain columns to encode.
+            Can also be a pyarrow Table or RecordBatch, a 2-D NumPy array or a scipy.sparse matrix (columns being
+            designated by their index).
+        :param bool copy: if False, encoded columns of a NumPy array are written directly into X, which is returned.
+            DataFrames and Arrow data are never modified: the output is a new frame sharing untouched columns with X,
+            only encoded columns being allocated, whatever `copy`.
+        :param [str] cols: columns to encode, among those learnt at fitting time, or None to encode all of them.
+            Other columns do not need to be in X (nor loaded, see `load_from_npy_files`).
 
         :return: encoded DataFrame of shape (n_samples, n_features), initial categorical columns are dropped, and
             replaced with encoded columns. DataFrame passed in argument is unchanged.
+            With several targets, each categorical column is replaced with one `<column>_<target>` column per target.
+            Arrow inputs give an Arrow output of the same type, sharing columns that are not encoded. Matrices give
+            a matrix of the same type and sparse format, encoded columns replacing initial ones at the same index.
         :rtype: pandas.DataFrame
         """
-        if not self._mapping:
-            raise ValueError('`fit` method must be called before `transform`.')
-        assert all(c in X.columns for c in self.cols)
+        with self._instrumentation.call('transform') as record:
+            self._check_fitted('transform')
+            cols = list(self._mapping) if cols is None else list(cols)
+            frame, _ = self._as_pandas(X, cols=cols)
+            assert all(c in self._mapping and c in frame.columns for c in cols)
+            if record is not None:
+                record['rows'] = frame.shape[0]
 
-        X_encoded = X.copy(deep=True)
-        for col, mapping in self._mapping.items():
-            X_encoded.loc[:, col] = X_encoded[col].fillna(NAN_CATEGORY).map(mapping['value'])
+            encoded = self._map_columns(lambda col: self._transform_column(col, frame[col]), cols)
+            return self._assemble(X, cols, encoded, copy)
+
+    def transform_iter(self, chunks, prefetch=1):
+        """Transform chunks of data one at a time, e.g. to encode data larger than memory.
+
+        :param iterable chunks: DataFrames (or any input accepted by `transform`), e.g. read from a file
+        :param int prefetch: number of chunks read in advance by a background thread while the current one is
+            encoded, 0 to read them in the calling thread
+
+        :return: encoded chunks (see `transform`)
+        :rtype: iterator
+        """
+        self._check_fitted('transform_iter')
+        return self._transform_chunks(streaming.prefetch(chunks, prefetch))
+
+    def _transform_chunks(self, chunks):
+        # Closing chunks stops the thread reading them, when the output is closed or after an encoding error
+        try:
+            for chunk in chunks:
+                yield self.transform(chunk)
+        finally:
+            chunks.close()
+
+    def _stable_chunk(self, chunk):
+        """Encoded chunk with column types that do not depend on its content, for chunks of a file to have the same
+        types.
+        """
+        return chunk
+
+    def transform_file(self, input_path, output_path, chunksize=2 ** 16, prefetch=1, file_format=None,
+                       csv_options=None):
+        """Transform a CSV or Parquet file into another, chunk by chunk, so that memory is bounded by the chunk size.
+
+        Chunks are read, encoded and written concurrently: while a chunk is written by the calling thread, the next
+        ones are encoded, and those after them read, by background threads.
+
+        Encoded columns have the same type in all chunks: integer labels of a LabelEncoder ignoring unseen categories
+        are written as nullable integers, missing for unseen categories.
+
+        :param str input_path: CSV file, or Parquet file or directory of Parquet files (requires pyarrow)
+        :param str output_path: file written, in the same format
+        :param int chunksize: maximum number of rows of each chunk
+        :param int prefetch: number of chunks read in advance, and of encoded chunks waiting to be written,
+            0 to read, encode and write chunks in turn in the calling thread
+        :param str file_format: 'csv' or 'parquet', None to infer it from the extension of input_path
+        :param dict csv_options: keyword arguments of `pandas.read_csv`, e.g. dtype of columns, for values to be
+            read with the type they had at fitting time
+
+        :return: number of rows written
+        :rtype: int
+        """
+        file_format = file_format or streaming.infer_format(input_path)
+        chunks = streaming.read_chunks(input_path, chunksize, file_format, csv_options)
+        transformed = self.transform_iter(chunks, prefetch)
+        encoded = streaming.prefetch((self._stable_chunk(chunk) for chunk in transformed), prefetch)
+        try:
+            return streaming.write_chunks(encoded, output_path, file_format)
+        finally:
+            # Background threads are stopped whatever happened, encoding being stopped before reading, and the input
+            # file closed once no thread reads it
+            encoded.close()
+            transformed.close()
+            chunks.close()
+
+    def _transform_column(self, col, values):
+        if self._transform_cache is None:
+            return self._encode_column(col, values)
+        # Version is read before encoding, so that a column encoded while mappings change is never found again
+        key = (col, self._mapping_version, fingerprint(values))
+        encoded = self._transform_cache.get(key)
+        if encoded is None:
+            encoded = self._encode_column(col, values)
+            self._transform_cache.put(key, encoded)
+        return encoded
+
+    def _as_pandas(self, X, y=None, cols=None):
+        # Only columns to encode are converted: those given, or those to fit
+        cols = self.cols if cols is None else cols
+        # Arrow inputs are converted without materializing strings as Python objects (see mlencoders.arrow)
+        if arrow.is_arrow(X):
+            assert cols is None or all(c in X.schema.names for c in cols)
+            X = arrow.to_frame(X, cols)
+        if arrow.is_arrow(y):
+            y = arrow.to_series(y)
+        if matrix.is_matrix(X):
+            assert cols is None or all(0 <= c < X.shape[1] for c in cols)
+            X = matrix.to_frame(X, cols)
+            if isinstance(y, np.ndarray):
+                y = pd.Series(y) if y.ndim == 1 else pd.DataFrame(y)
+        return X, y
+
+    def _assemble(self, X, cols, encoded_columns, copy=True):
+        """Input with given columns replaced by their encoded values, as a DataFrame or as Arrow data, like X."""
+        replacements = {col: self._encoded_items(col, encoded) for col, encoded in zip(cols, encoded_columns)}
+        if arrow.is_arrow(X):
+            return arrow.replace_columns(X, replacements)
+        if matrix.is_matrix(X):
+            return matrix.replace_columns(X, replacements, copy)
+        return replace_columns(X, replacements)
+
+    def _encoded_items(self, col, encoded):
+        """Names and values of the output columns of an encoded column, one per target."""
+        if self._targets is None:
+            return [(col, encoded)]
+        return [(name, encoded[:, i]) for i, name in enumerate(self._target_columns(col))]
+
+    def _target_columns(self, col):
+        return ['{}_{}'.format(col, target) for target in self._targets]
+
+    def _encode_column(self, col, values):
+        mapping = self._mapping[col]
+        with self._instrumentation.phase(col, 'lookup') as record:
+            codes = self._lookup(mapping, values)
+            if record is not None:
+                record.update(rows=len(codes), categories=len(mapping), bytes=codes.nbytes)
+        return self._encode_codes(col, codes, values)
+
+    def _encode_codes(self, col, codes, values, out=None):
+        """Encoded values of a column from the positions of its values in the mapping (see `_lookup`).
+
+        :param str col: column name
+        :param numpy.ndarray codes: positions in the mapping, -1 for unseen categories, shape (n_samples,)
+        :param pandas.Series values: values of the column, shape (n_samples,), to report unseen categories
+        :param numpy.ndarray out: array where encoded values are written, shape (n_samples,) or (n_samples, n_targets),
+            None to allocate it
+
+        :rtype: numpy.ndarray
+        """
+        mapping = self._mapping[col]
+        with self._instrumentation.phase(col, 'take') as record:
+            # Values are stored with the output dtype, the output column is the only allocation
+            if out is None:
+                encoded = mapping.values.take(codes, axis=0)
+            else:
+                encoded = np.take(mapping.values.astype(out.dtype, copy=False), codes, axis=0, out=out)
+            unseen = codes == -1
+            if record is not None:
+                record.update(rows=len(codes), unseen=np.count_nonzero(unseen), bytes=encoded.nbytes)
+            if not unseen.any():
+                return encoded
+            if self.handle_unseen == 'error':
+                raise self._unseen_error(col, np.asarray(values)[unseen])
+            fill = self._imputed if self.handle_unseen == 'impute' else np.nan
+            if encoded.dtype.kind in 'iu' and np.isnan(fill):
+                # Integer labels cannot hold missing values
+                encoded = encoded.astype(np.float64)
+            encoded[unseen] = fill
+            return encoded
+
+    def _unseen_error(self, col, unseen_values, max_shown=10):
+        # Reporting unseen categories with their number of rows, most frequent first
+        counts = pd.Series(unseen_values, dtype=object).value_counts(dropna=False)
+        shown = ', '.join('{!r} ({})'.format(category, n) for category, n in counts.iloc[:max_shown].items())
+        return ValueError('Unseen categories found in `{}` column: {} rows, {} categories: {}{}.'.format(
+            col, len(unseen_values), len(counts), shown, ', ...' if len(counts) > max_shown else ''))
+
+    def transform_record(self, record):
+        """Transform a single record, with plain dict lookups. Meant for low latency online serving.
+
+        :param dict record: features of one sample, {column name: value}. Must contain columns to encode.
+
+        :return: copy of the record, with values of encoded columns replaced
+        :rtype: dict
+        """
+        self._check_fitted('transform_record')
+        encoded = dict(record)
+        for col in self._mapping:
+            value = self._encode_value(col, record[col])
+            if self._targets is None:
+                encoded[col] = value
+            else:
+                del encoded[col]
+                encoded.update(zip(self._target_columns(col), value))
+        return encoded
+
+    def transform_records(self, records):
+        """Transform a micro-batch of records, with plain dict lookups. Meant for low latency online serving.
+
+        :param [dict] records: features of each sample, {column name: value}. Must contain columns to encode.
+
+        :return: encoded values, shape (n_records, n_encoded_columns), columns following the order of `cols` (and of
+            targets within each column, if several)
+        :rtype: numpy.ndarray
+        """
+        self._check_fitted('transform_records')
+        cols = [col for col in self.cols if col in self._mapping]
+        encoded = np.array([[self._encode_value(col, record[col]) for col in cols] for record in records])
+        return encoded.reshape(len(records), -1)
+
+    def _encode_value(self, col, value):
+        if self.n_buckets is not None:
+            mapping = self._mapping[col]
+            code = self._lookup(mapping, pd.Series([value]))[0]
+            if code != -1:
+                return mapping.values[code].tolist()
+        else:
+            lookup = self._mapping[col].to_dict()
+            # Missing values (None or NaN) are stored under NAN_CATEGORY
+            key = NAN_CATEGORY if value is None or value != value else value
+            if key in lookup:
+                return lookup[key]
+        if self.handle_unseen == 'error':
+            raise self._unseen_error(col, [value])
+        if self.handle_unseen == 'impute':
+            return self._imputed
+        return np.nan if self._targets is None else [np.nan] * len(self._targets)
+
+    def fit(self, X, y=None):
+        """Encode given columns of X according to y.
+
+        :param pandas.DataFrame X: DataFrame of features, shape (n_samples, n_features). Must contain columns to encode.
+            Can also be a pyarrow Table or RecordBatch, a 2-D NumPy array or a scipy.sparse matrix (columns being
+            designated by their index).
+        :param pandas.Series y: pandas Series of target values, shape (n_samples,), or pyarrow or NumPy array.
+            Required only for encoders that need it: TargetEncoder, WeightOfEvidenceEncoder
+
+        :return: None
+        """
+        with self._instrumentation.call('fit'):
+            self._reset()
+            self.partial_fit(X, y)
+            self._finalize()
+
+    def partial_fit(self, X, y=None):
+        """Update the encoder with a chunk of data, e.g. when the full dataset does not fit in memory.
+
+        Only the statistics of each category are accumulated, mapping values are derived from them on first use.
+
+        :param pandas.DataFrame X: DataFrame of features, shape (n_samples, n_features). Must contain columns to encode.
+            Can also be a pyarrow Table or RecordBatch, a 2-D NumPy array or a scipy.sparse matrix (columns being
+            designated by their index).
+        :param pandas.Series y: pandas Series of target values, shape (n_samples,), or pyarrow or NumPy array.
+            Required only for encoders that need it: TargetEncoder, WeightOfEvidenceEncoder
+
+        :return: None
+        """
+        with self._instrumentation.call('partial_fit') as record:
+            X, y = self._as_pandas(X, y)
+            self._before_fit_check(X, y)
+            if record is not None:
+                record['rows'] = X.shape[0]
+            self._accumulate(X, y)
+            self._mapping_changed()
 
-            if self.handle_unseen == 'impute':
-                X_encoded[col].fillna(self._imputed, inplace=True)
-            elif self.handle_unseen == 'error':
-                if np.unique(X_encoded[col]).shape[0] > mapping.shape[0]:
-                    raise ValueError('Unseen categories found in `{}` column.'.format(col))
+    def fit_from_iterator(self, chunks):
+        """Encode given columns from an iterable of chunks, holding a single chunk in memory at a time.
 
-        return X_encoded
+        :param iterable chunks: (X, y) tuples of DataFrame and Series, or DataFrames X alone for encoders that do not
+            need a target (LabelEncoder)
 
-    def fit_transform(self, X, y=None):
+        :return: None
+        """
+        with self._instrumentation.call('fit_from_iterator'):
+            self._reset()
+            for chunk in chunks:
+                X, y = chunk if isinstance(chunk, tuple) else (chunk, None)
+                self.partial_fit(X, y)
+            self._finalize()
+
+    @classmethod
+    def merge(cls, encoders):
+        """Combine encoders fitted on separate shards of data, e.g. by different worker processes.
+
+        The result is the encoder that would be obtained by fitting on the concatenation of all shards, in order.
+
+        :param [BaseEncoder] encoders: fitted encoders of this class, with the same parameters and columns
+
+        :return: new merged encoder, encoders passed in argument are unchanged
+        :rtype: BaseEncoder
+        """
+        encoders = list(encoders)
+        for enc in encoders:
+            if not enc._mapping:
+                raise ValueError('`fit` method must be called before `merge`.')
+            assert isinstance(enc, cls) and list(enc.cols) == list(encoders[0].cols)
+        merged = copy.deepcopy(encoders[0])
+        for enc in encoders[1:]:
+            merged._merge(enc)
+        merged._mapping_changed()
+        merged._finalize()
+        return merged
+
+    def __add__(self, other):
+        return self.merge([self, other])
+
+    def fit_transform(self, X, y=None, cv=None):
         """Encode given columns of X according to y, and transform X based on the learnt mapping.
 
         :param pandas.DataFrame X: DataFrame of features, shape (n_samples, n_features). Must contain columns to encode.
-        :param pandas.Series y: pandas Series of target values, shape (n_samples,).
+            Can also be a pyarrow Table or RecordBatch, a 2-D NumPy array or a scipy.sparse matrix (columns being
+            designated by their index).
+        :param pandas.Series y: pandas Series of target values, shape (n_samples,), or pyarrow or NumPy array.
             Required only for encoders that need it: TargetEncoder, WeightOfEvidenceEncoder
+        :param cv: for encoders learning from y only, out-of-fold encoding to avoid target leakage. Each sample is
+            encoded from statistics of samples outside its fold, and the mapping learnt on all samples is kept.
+            None  - default value, samples are encoded from statistics of all samples, including themselves
+            int   - number of contiguous folds, from 2 to X.shape[0] (meaning leave-one-out)
+            array - fold of each sample, shape (n_samples,), with at least 2 folds
 
         :return: encoded DataFrame of shape (n_samples, n_features), initial categorical columns are dropped, and
             replaced with encoded columns. DataFrame passed in argument is unchanged.
         :rtype: pandas.DataFrame
         """
-        self.fit(X, y)
-        return self.transform(X)
+        if cv is not None and not hasattr(self, '_values_from_stats'):
+            raise ValueError('Out-of-fold encoding is only available for encoders learning from a target.')
+        with self._instrumentation.call('fit_transform') as record:
+            frame, y = self._as_pandas(X, y)
+            if record is not None:
+                record['rows'] = frame.shape[0]
+            folds = self._folds(cv, frame.shape[0]) if cv is not None else None
+            self.fit(frame, y)
+            cols = list(self._mapping)
+            if cv is None:
+                encoded = self._map_columns(lambda col: self._encode_column(col, frame[col]), cols)
+            else:
+                encoded = self._transform_out_of_fold(frame, y, folds)
+            return self._assemble(X, cols, encoded)
+
+    def _folds(self, cv, n_samples):
+        # Fold of each sample, at least 2 folds being needed for each sample to have statistics out of its fold
+        if np.isscalar(cv):
+            if not 2 <= cv <= n_samples:
+                raise ValueError('cv must be between 2 and the number of samples ({}), got {}.'.format(n_samples, cv))
+            return np.arange(n_samples) * cv // n_samples
+        folds = np.asarray(cv)
+        if folds.shape != (n_samples,):
+            raise ValueError('cv must be the fold of each sample, of shape ({},), got {}.'.format(n_samples,
+                                                                                                  folds.shape))
+        if len(pd.unique(folds)) < 2:
+            raise ValueError('cv must give at least 2 folds.')
+        return folds
+
+    def _transform_out_of_fold(self, X, y, folds):
+        # Encoded values of each column to encode. Statistics of each fold are subtracted from statistics of all
+        # samples, for all folds in a single pass
+        y = self._prepare_targets(y)
+        fold_codes, fold_names = pd.factorize(folds)
+        # Sums are of shape (n_samples, n_targets), counts of shape (n_samples, 1)
+        fold_stats = self._target_stats(fold_codes, len(fold_names), y)
+        total_stats = (fold_stats.sum(axis=0) - fold_stats)[fold_codes]
+        total_sum, total_count = total_stats[:, :-1], total_stats[:, -1:]
+
+        def col_values(col):
+            mapping = self._mapping[col]
+            with self._instrumentation.phase(col, 'out_of_fold') as record:
+                codes = self._lookup(mapping, X[col])
+                # Codes of (fold, category) pairs
+                pair_codes, pairs = pd.factorize(fold_codes * len(mapping) + codes)
+                stats = mapping.stats[codes] - self._target_stats(pair_codes, len(pairs), y)[pair_codes]
+                sums, counts = stats[:, :-1], stats[:, -1:]
+                values = self._values_from_stats(sums, counts, total_sum, total_count)
+                values = self._squeeze_targets(values).astype(self.dtype, copy=False)
+                if record is not None:
+                    record.update(rows=len(codes), categories=len(mapping), bytes=values.nbytes)
+                return values
+
+        return self._map_columns(col_values, list(self._mapping))
+
+    def _squeeze_targets(self, values):
+        # Values are computed with one column per target, a single target having no such dimension
+        return values[..., 0] if self._targets is None else values
+
+    def _reset(self):
+        self._mapping = {}
+        self._unfolded = {}
+        self._targets = None
+        self._mapping_changed()
+
+    def _mapping_changed(self):
+        # Encoded columns cached for previous mappings are not valid anymore
+        self._mapping_version += 1
+        if self._transform_cache is not None:
+            self._transform_cache.clear()
+
+    def _finalize(self):
+        # Deriving mapping values from accumulated statistics, if not done since last update. Lazily loaded mappings
+        # were saved once derived, only those assigned since loading are checked, not to load all of them.
+        mappings = self._mapping.assigned if isinstance(self._mapping, LazyMapping) else self._mapping
+        if any(mapping.values is None for mapping in mappings.values()):
+            with self._instrumentation.phase(None, 'build') as record:
+                self._mapping = {col: self._collapse(self._unfolded.get(col, mapping))
+                                 for col, mapping in self._mapping.items()}
+                self._build_mapping()
+                if record is not None:
+                    record.update(categories=sum(len(mapping) for mapping in self._mapping.values()),
+                                  bytes=sum(mapping.values.nbytes for mapping in self._mapping.values()))
+
+    def _check_fitted(self, method):
+        self._finalize()
+        if not self._mapping:
+            raise ValueError('`fit` method must be called before `{}`.'.format(method))
+
+    def _accumulate(self, X, y):
+        """Add sum (of each target, if several) and count of target values of each category to statistics, for each
+        column to encode.
+
+        Columns are factorized once, and statistics are accumulated with `numpy.bincount` on the category codes.
+        Targets are converted once for all columns.
+        """
+        y = self._prepare_targets(y)
+        stat_names = ('sum', 'count') if self._targets is None else \
+            tuple('sum_{}'.format(target) for target in self._targets) + ('count',)
+
+        def col_mapping(col):
+            with self._instrumentation.phase(col, 'factorize') as record:
+                codes, categories = self._factorize(X[col])
+                n_categories = len(categories)
+                if record is not None:
+                    record.update(rows=len(codes), categories=n_categories, bytes=codes.nbytes)
+            with self._instrumentation.phase(col, 'accumulate') as record:
+                stats = self._target_stats(codes, n_categories, y)
+                # Values are derived again from statistics when needed
+                mapping = CategoryMapping(categories.values, stats=stats, stat_names=stat_names)
+                previous = self._accumulated(col)
+                if previous is not None:
+                    mapping = self._merge_mappings([previous, mapping])
+                if record is not None:
+                    record.update(rows=len(codes), categories=len(mapping), bytes=mapping.stats.nbytes)
+                return mapping
+
+        self._set_accumulated(zip(self.cols, self._map_columns(col_mapping, self.cols)))
+
+    def _accumulated(self, col):
+        """Statistics accumulated so far for a column, before folding, or None if it was not fitted yet."""
+        return self._unfolded.get(col, self._mapping.get(col))
+
+    def _set_accumulated(self, mappings):
+        """Replace mappings by ones of accumulated statistics, whose values are derived (and categories folded) later.
+
+        :param iterable mappings: (column name, CategoryMapping) pairs
+
+        :return: None
+        """
+        folding = self.max_categories is not None or self.min_frequency is not None
+        for col, mapping in mappings:
+            self._mapping[col] = mapping
+            if folding:
+                self._unfolded[col] = mapping
+
+    def _prepare_targets(self, y):
+        """Targets as expected by `_target_stats`: float array of shape (n_samples, n_targets), and weight of each
+        sample, 0 for samples with a missing target (whose target values are set to 0), or None if none is missing.
+        """
+        y = np.asarray(y, dtype=float).reshape(len(y), -1)
+        missing = np.isnan(y).any(axis=1)
+        if not missing.any():
+            return y, None
+        return np.where(missing[:, None], 0., y), (~missing).astype(float)
+
+    def _target_stats(self, codes, n_categories, y):
+        """Sums of target values and count of samples of each category, shape (n_categories, n_targets + 1), y being
+        given by `_prepare_targets`. Samples with a missing target are left out of both, as in a mean.
+        """
+        y, weights = y
+        return np.column_stack([
+            self._target_sums(codes, n_categories, y, weights),
+            np.bincount(codes, weights=weights, minlength=n_categories),
+        ]).astype(float)
+
+    def _target_sums(self, codes, n_categories, y, weights):
+        """Sums of target values of each category, shape (n_categories, n_targets)."""
+        return np.column_stack([np.bincount(codes, weights=target, minlength=n_categories) for target in y.T])
+
+    def _collapse(self, mapping):
+        """Fold categories rarer than `min_frequency`, or beyond the `max_categories` most frequent ones, into
+        OTHER_CATEGORY, summing their statistics, and keeping their keys to look them up there. Values of the returned
+        mapping are to be derived again.
+
+        Only done when deriving values: statistics are accumulated for all categories, as a category rare in a chunk
+        may be frequent overall.
+        """
+        if self.max_categories is None and self.min_frequency is None:
+            return mapping
+        counts = mapping.stats[:, mapping.stat_names.index('count')]
+        keep = np.ones(len(mapping), dtype=bool) if self.min_frequency is None else counts >= self.min_frequency
+        # An other bucket of mappings saved folded is folded again with new rare categories
+        other_position = mapping.index.get_indexer([OTHER_CATEGORY])[0]
+        if other_position != -1:
+            keep[other_position] = False
+        if self.max_categories is not None and keep.sum() > self.max_categories:
+            # Partial selection of the most frequent categories, without sorting all of them
+            top = np.argpartition(np.where(keep, -counts, np.inf), self.max_categories - 1)[:self.max_categories]
+            keep = np.zeros(len(mapping), dtype=bool)
+            keep[top] = True
+        if keep.all():
+            return mapping
+        keys = mapping.keys[keep]
+        if keys.dtype.kind in 'SU':
+            keys = keys.astype(object)
+        stats = np.vstack([mapping.stats[keep], mapping.stats[~keep].sum(axis=0)])
+        folded = ~keep
+        if other_position != -1:
+            folded[other_position] = False
+        folded = mapping.keys[folded]
+        if mapping.folded is not None:
+            # Categories folded before, unless kept now
+            previous = mapping.folded[~pd.Index(mapping.folded).isin(keys)]
+            folded = np.concatenate([previous, folded])
+        return CategoryMapping(np.append(keys, OTHER_CATEGORY), stats=stats, stat_names=mapping.stat_names,
+                               folded=folded)
+
+    def _factorize(self, values, sort=True):
+        """Codes and categories of a column, missing values being the NAN_CATEGORY category.
+
+        Categorical columns are factorized from their codes, and missing values are not filled beforehand.
+        With hashed encoding, codes are buckets, and categories all bucket numbers.
+
+        :param pandas.Series values: column to factorize
+        :param bool sort: whether to sort categories, otherwise they are in order of first appearance
+
+        :return: codes of values, shape (n_samples,), and categories
+        :rtype: (numpy.ndarray, pandas.Index)
+        """
+        if self.n_buckets is not None:
+            return self._hash(values), pd.RangeIndex(self.n_buckets, name=values.name)
+        codes, categories = pd.factorize(values, sort=sort)
+        categories = pd.Index(np.asarray(categories), name=values.name)
+        missing = codes == -1
+        if not missing.any():
+            return codes, categories
+        if NAN_CATEGORY in categories:
+            codes[missing] = categories.get_loc(NAN_CATEGORY)
+            return codes, categories
+        # Sorted first, as a filled NAN_CATEGORY would be among string categories; otherwise at its first appearance
+        first_missing = missing.argmax()
+        position = 0 if sort or first_missing == 0 else codes[:first_missing].max() + 1
+        codes[codes >= position] += 1
+        codes[missing] = position
+        return codes, categories.insert(position, NAN_CATEGORY)
+
+    def _hash(self, values):
+        # Stable across processes and platforms. Categorical columns are hashed from their categories.
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            categories = self._hash_values(pd.Series(values.cat.categories))
+            hashes = np.append(categories, MISSING_HASH).take(values.cat.codes.values)
+        else:
+            hashes = self._hash_values(values)
+        return (hashes % np.uint64(self.n_buckets)).astype(np.intp)
+
+    def _hash_values(self, values):
+        """Hashes of values, equal for equal values whatever the dtype of their column: integral floats are hashed as
+        integers, e.g. for 2.0 to fall into the bucket of 2, and missing values all alike.
+        """
+        numeric = ('integer', 'floating', 'mixed-integer-float')
+        if values.dtype == object and pd.api.types.infer_dtype(values) in numeric:
+            values = pd.to_numeric(values)
+        if values.dtype.kind != 'f':
+            return pd.util.hash_pandas_object(values, index=False).values
+        floats = values.astype(np.float64).values
+        integral = (floats == np.round(floats)) & (np.abs(floats) < 2 ** 63)
+        if integral.all():
+            return self._hash_values(pd.Series(floats.astype(np.int64)))
+        hashes = pd.util.hash_pandas_object(pd.Series(floats), index=False).values
+        hashes[integral] = self._hash_values(pd.Series(floats[integral].astype(np.int64)))
+        hashes[np.isnan(floats)] = MISSING_HASH
+        return hashes
+
+    def _lookup(self, mapping, values):
+        """Position of each value in the mapping, -1 for unseen categories.
+
+        With hashed encoding, positions are buckets, and only categories falling into empty buckets are unseen.
+        """
+        if self.n_buckets is None:
+            return mapping.lookup(values)
+        codes = self._hash(values)
+        counts = mapping.stats[:, mapping.stat_names.index('count')]
+        return np.where(counts.take(codes) > 0, codes, -1)
+
+    def collision_stats(self):
+        """Occupancy of hashed encoding tables, to size `n_buckets`.
+
+        The number of distinct categories is estimated from the fraction of empty buckets (linear counting), so that
+        no category is stored, and estimates hold for chunked or merged fits.
+
+        :return: DataFrame indexed by encoded column, with columns
+            buckets        - number of buckets
+            occupied       - number of buckets holding at least one category
+            categories     - estimated number of distinct categories, infinite if all buckets are occupied
+            collision_rate - estimated fraction of categories sharing their bucket with other categories
+        :rtype: pandas.DataFrame
+        """
+        self._check_fitted('collision_stats')
+        if self.n_buckets is None:
+            raise ValueError('Collision statistics are only available with hashed encoding (n_buckets).')
+        occupied = np.array([np.count_nonzero(mapping.stats[:, mapping.stat_names.index('count')])
+                             for mapping in self._mapping.values()])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            categories = -self.n_buckets * np.log1p(-occupied / self.n_buckets)
+            collision_rate = np.where(occupied > 0, 1 - occupied / categories, 0.)
+        return pd.DataFrame({'buckets': self.n_buckets, 'occupied': occupied, 'categories': categories,
+                             'collision_rate': collision_rate}, index=list(self._mapping),
+                            columns=['buckets', 'occupied', 'categories', 'collision_rate'])
+
+    def _merge(self, other):
+        self._set_accumulated([(col, self._merge_mappings([self._accumulated(col), other._accumulated(col)]))
+                               for col in list(self._mapping)])
+
+    def _merge_mappings(self, mappings):
+        """Sum statistics of mappings over categories, keeping categories sorted as in a single fit."""
+        codes, keys = pd.factorize(np.concatenate([mapping.keys for mapping in mappings]), sort=True)
+        stats = np.concatenate([mapping.stats for mapping in mappings])
+        stats = np.column_stack([np.bincount(codes, weights=stat, minlength=len(keys)) for stat in stats.T])
+        # Categories folded into OTHER_CATEGORY of mappings saved folded are still looked up there
+        folded = [mapping.folded for mapping in mappings if mapping.folded is not None]
+        folded = pd.unique(np.concatenate(folded)) if folded else None
+        return CategoryMapping(keys, stats=stats, stat_names=mappings[0].stat_names, folded=folded)
+
+    def _map_columns(self, func, cols):
+        return map_columns(func, cols, self.n_jobs)
 
     def _input_check(self, name, value, options):
         if value not in options:
             raise ValueError('Wrong input: {} parameter must be in {}'.format(name, options))
 
+    def _dtype_check(self, dtype, kinds):
+        # Kinds of numpy dtypes, e.g. 'f' for floats, 'iu' for integers
+        if dtype is not None and np.dtype(dtype).kind not in kinds:
+            raise ValueError('Wrong input: dtype must be of kind {}, got {}'.format(list(kinds), np.dtype(dtype).name))
+
     def _before_fit_check(self, X, y):
         # Checking columns to encode
         if self.cols is None:
@@ -81,10 +815,118 @@ class BaseEncoder(object):
             assert X.shape[0] == y.shape[0]
 
     def save_as_object_file(self, path):
-        if not self._mapping:
-            raise ValueError('`fit` method must be called before `save_as_object_file`.')
-        pickle.dump(self.__dict__, open(path, 'wb'))
+        self._check_fitted('save_as_object_file')
+        # Instrumentation and cache are not part of the state, the instrumentation callback may not be serializable
+        state = {k: v for k, v in self.__dict__.items()
+                 if k not in ('_instrumentation', '_transform_cache', '_mapping_version')}
+        state['_mapping'] = dict(self._mapping)
+        with open(path, 'wb') as f:
+            pickle.dump(state, f, protocol=2)
 
     def load_from_object_file(self, path):
-        for k, v in pickle.load(open(path, 'rb')).items():
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+        # Files saved by previous versions do not hold statistics before folding
+        self._unfolded = {}
+        for k, v in state.items():
+            setattr(self, k, v)
+        self._mapping_changed()
+        # Files saved by previous versions hold a DataFrame per column, with values in the `value` column
+        for col, mapping in self._mapping.items():
+            if isinstance(mapping, pd.DataFrame):
+                self._mapping[col] = CategoryMapping(mapping.index.values, mapping['value'].values)
+
+    def save_as_npy_files(self, path):
+        """Save encoder state as a JSON header with parameters, and one .npy file per array of each mapping.
+
+        Unlike `save_as_object_file`, arrays can be memory-mapped at loading time, and shared between processes.
+
+        :param str path: directory where files are written, created if needed
+
+        :return: None
+        """
+        self._check_fitted('save_as_npy_files')
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        columns = []
+        for i, (col, mapping) in enumerate(self._mapping.items()):
+            nan_position, utf8_keys = self._save_keys(path, '{}.keys'.format(i), '{}.key_offsets'.format(i),
+                                                      mapping.keys)
+            np.save(os.path.join(path, '{}.values.npy'.format(i)), mapping.values)
+            if mapping.stats is not None:
+                np.save(os.path.join(path, '{}.stats.npy'.format(i)), mapping.stats)
+            column = {'name': col, 'nan_position': nan_position, 'utf8_keys': utf8_keys,
+                      'stat_names': mapping.stat_names, 'has_stats': mapping.stats is not None, 'folded': None}
+            if mapping.folded is not None:
+                nan_position, utf8_keys = self._save_keys(path, '{}.folded'.format(i), '{}.folded_offsets'.format(i),
+                                                          mapping.folded)
+                column['folded'] = {'nan_position': nan_position, 'utf8_keys': utf8_keys}
+            columns.append(column)
+
+        header = {
+            'format_version': NPY_FORMAT_VERSION,
+            'encoder': self.__class__.__name__,
+            'params': {k: v for k, v in self.__dict__.items() if not k.startswith('_')},
+            'imputed': self._imputed,
+            'targets': self._targets,
+            'columns': columns,
+        }
+        header['params']['cols'] = list(self.cols)
+        with open(os.path.join(path, 'header.json'), 'w') as f:
+            # Numpy scalars and arrays are converted to their python equivalent
+            json.dump(header, f, default=lambda obj: obj.tolist())
+
+    def load_from_npy_files(self, path, mmap_mode='r', lazy=False, max_resident=None):
+        """Load encoder state saved with `save_as_npy_files`.
+
+        :param str path: directory where files were written
+        :param str mmap_mode: mode used to memory-map arrays (see `numpy.load`), None to load them in memory
+        :param bool lazy: if True, the mapping of each column is loaded on first use only, so that loading time and
+            memory scale with the columns actually encoded (see `cols` of `transform`) rather than with all columns
+        :param int max_resident: with lazy loading, maximum number of columns kept in memory, least recently used
+            ones being loaded again on next use. None means no limit.
+
+        :return: None
+        """
+        with open(os.path.join(path, 'header.json')) as f:
+            header = json.load(f)
+        if header['format_version'] > NPY_FORMAT_VERSION:
+            raise ValueError('Unsupported format version {}, upgrade mlencoders to load this file.'.format(
+                header['format_version']))
+        if header['encoder'] != self.__class__.__name__:
+            raise ValueError('Cannot load a {} into a {}.'.format(header['encoder'], self.__class__.__name__))
+
+        for k, v in header['params'].items():
             setattr(self, k, v)
+        self._reset()
+        self._targets = header.get('targets')
+        self._imputed = np.array(header['imputed']) if self._targets is not None else header['imputed']
+        if lazy:
+            self._mapping = LazyMapping(path, header['columns'], mmap_mode, max_resident)
+            return
+        for i, column in enumerate(header['columns']):
+            self._mapping[column['name']] = load_column(path, i, column, mmap_mode)
+
+    def _save_keys(self, path, name, offsets_name, keys):
+        # Position of NAN_CATEGORY and whether keys are stored as UTF-8 bytes (see `_keys_to_array`)
+        keys, nan_position, key_offsets = self._keys_to_array(keys)
+        np.save(os.path.join(path, '{}.npy'.format(name)), keys, allow_pickle=keys.dtype == object)
+        if key_offsets is not None:
+            np.save(os.path.join(path, '{}.npy'.format(offsets_name)), key_offsets)
+        return nan_position, key_offsets is not None
+
+    def _keys_to_array(self, keys):
+        # Mixed NAN_CATEGORY and string categories are stored as the UTF-8 bytes of all strings and the offset of
+        # each one in them, which can be memory-mapped whatever the length of strings, and the position of
+        # NAN_CATEGORY. Other object arrays have to be pickled.
+        if keys.dtype != object:
+            return keys, None, None
+        nan_positions = np.flatnonzero(pd.Index(keys) == NAN_CATEGORY)
+        nan_position = int(nan_positions[0]) if len(nan_positions) else None
+        strings = keys if nan_position is None else np.delete(keys, nan_position)
+        if pd.api.types.infer_dtype(strings) != 'string':
+            return keys, None, None
+        encoded = [string.encode('utf-8') for string in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(string) for string in encoded], out=offsets[1:])
+        return np.frombuffer(b''.join(encoded), dtype=np.uint8), nan_position, offsets
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import numpy as np
+import pandas as pd
+
+NAN_CATEGORY = -99999
+# Category into which rare categories are folded at fitting time
+OTHER_CATEGORY = -99998
+
+
+class CategoryMapping(object):
+    """
+    Mapping from categories of a column to encoded values, backed by numpy arrays.
+
+    Encoders learning from a target also keep sufficient statistics of each category, from which values are derived.
+    Lookup structures are built on first use only. Categories folded into OTHER_CATEGORY at fitting time are looked
+    up there, other values not found in the mapping being unseen.
+    """
+
+    __slots__ = ('keys', 'values', 'stats', 'stat_names', 'folded', '_index', '_nan_position', '_other_position',
+                 '_table', '_dict', '_folded_mapping')
+
+    def __init__(self, keys, values=None, stats=None, stat_names=(), folded=None):
+        """Instantiation
+
+        :param numpy.ndarray keys: categories, shape (n_categories,), missing values being NAN_CATEGORY
+        :param numpy.ndarray values: encoded value of each category, shape (n_categories,) or (n_categories, n_targets),
+            or None if not derived yet
+        :param numpy.ndarray stats: statistics of each category, shape (n_categories, n_stats), or None
+        :param tuple stat_names: names of statistics, shape (n_stats,)
+        :param numpy.ndarray folded: categories folded into OTHER_CATEGORY, missing values being NAN_CATEGORY, or None
+
+        :return: None
+        """
+        self.keys = keys
+        self.values = values
+        self.stats = stats
+        self.stat_names = tuple(stat_names)
+        self.folded = folded
+        self._index = None
+        self._nan_position = None
+        self._other_position = None
+        self._table = None
+        self._dict = None
+        self._folded_mapping = None
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __getstate__(self):
+        # Lookup structures are not serialized, they are rebuilt on first use
+        return self.keys, self.values, self.stats, self.stat_names, self.folded
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    @property
+    def index(self):
+        """Hash table of categories.
+
+        :rtype: pandas.Index
+        """
+        if self._index is None:
+            self._index = pd.Index(self.keys)
+            self._nan_position = self._index.get_loc(NAN_CATEGORY) if NAN_CATEGORY in self._index else None
+            self._other_position = self._index.get_loc(OTHER_CATEGORY) if OTHER_CATEGORY in self._index else None
+            # Small non negative integer categories are also looked up in a dense table indexed by value
+            if pd.api.types.is_integer_dtype(self._index.dtype) and len(self._index) and self._index.min() >= 0 \
+                    and self._index.max() < 2 * len(self._index) + 1024:
+                self._table = np.full(self._index.max() + 1, -1, dtype=np.int64)
+                self._table[self._index.values] = np.arange(len(self._index))
+        return self._index
+
+    def with_values(self, values):
+        """Copy of the mapping with given values, sharing keys, statistics and lookup structures."""
+        mapping = CategoryMapping(self.keys, values, self.stats, self.stat_names, self.folded)
+        if self._index is not None:
+            mapping._index, mapping._nan_position, mapping._table = self._index, self._nan_position, self._table
+            mapping._other_position = self._other_position
+        mapping._folded_mapping = self._folded_mapping
+        return mapping
+
+    def lookup(self, values):
+        """Position of each value in the mapping, -1 for unseen categories. Categories folded at fitting time get the
+        position of OTHER_CATEGORY.
+
+        :param pandas.Series values: column to look up, shape (n_samples,)
+
+        :rtype: numpy.ndarray
+        """
+        codes = self._lookup(values)
+        if self._other_position is None or self.folded is None:
+            return codes
+        unseen_rows = np.flatnonzero(codes == -1)
+        if len(unseen_rows):
+            # Only values not found among kept categories are looked up among folded ones
+            if self._folded_mapping is None:
+                self._folded_mapping = CategoryMapping(self.folded)
+            folded = self._folded_mapping._lookup(values.iloc[unseen_rows]) != -1
+            codes[unseen_rows[folded]] = self._other_position
+        return codes
+
+    def _lookup(self, values):
+        index = self.index
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            # Categories are looked up once, then taken by code, missing values having code -1
+            positions = index.get_indexer(values.cat.categories)
+            nan_position = -1 if self._nan_position is None else self._nan_position
+            return np.append(positions, nan_position).take(values.cat.codes.values)
+        if self._table is not None and pd.api.types.is_integer_dtype(values.dtype):
+            values = np.asarray(values)
+            return np.where((values >= 0) & (values < len(self._table)), self._table.take(values, mode='clip'), -1)
+        # Single hash lookup pass
+        codes = index.get_indexer(values)
+        unseen = codes == -1
+        if unseen.any() and self._nan_position is not None:
+            # Missing values are looked up only there, instead of being filled with NAN_CATEGORY beforehand
+            unseen_rows = np.flatnonzero(unseen)
+            codes[unseen_rows[pd.isna(np.asarray(values)[unseen_rows])]] = self._nan_position
+        return codes
+
+    def to_dict(self):
+        """Plain dict lookup {category: value}, for fast encoding of single values.
+
+        :rtype: dict
+        """
+        if self._dict is None:
+            values = self.values.tolist()
+            self._dict = {}
+            if self.folded is not None and OTHER_CATEGORY in self.index:
+                self._dict = dict.fromkeys(self.folded.tolist(), values[self.index.get_loc(OTHER_CATEGORY)])
+            self._dict.update(zip(self.keys.tolist(), values))
+        return self._dict
+
+    def to_frame(self):
+        """DataFrame view of the mapping, for inspection: one row per category, statistics and value as columns.
+
+        :rtype: pandas.DataFrame
+        """
+        frame = pd.DataFrame(self.stats, index=self.index, columns=list(self.stat_names))
+        if self.values is not None and self.values.ndim == 2:
+            # One value per target
+            for i in range(self.values.shape[1]):
+                frame['value_{}'.format(i)] = self.values[:, i]
+        elif self.values is not None:
+            frame['value'] = self.values
+        return frame
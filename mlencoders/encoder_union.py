@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import numpy as np
+import pandas as pd
+
+from mlencoders.base_encoder import map_columns
+from mlencoders.base_encoder import replace_columns
+
+
+class EncoderUnion(object):
+    """
+    Several encoders applied in a single transform pass, e.g. a LabelEncoder and a TargetEncoder of the same columns.
+
+    Each source column is factorized once, and only its distinct categories are looked up in the mapping of each
+    encoder of the column. Encoded values are then taken from the shared codes, into a single preallocated array.
+    """
+
+    def __init__(self, encoders, n_jobs=1, dtype=np.float64):
+        """Instantiation
+
+        :param [(str, BaseEncoder)] encoders: named encoders. A column encoded by several encoders gets one output
+            column `<column>_<name>` per encoder, otherwise encoded columns keep their name.
+        :param int n_jobs: number of threads used to process source columns in parallel, -1 means using all processors
+        :param dtype: float dtype of encoded columns, but those of LabelEncoders with `as_category`
+
+        :return: None
+        """
+        if np.dtype(dtype).kind != 'f':
+            raise ValueError('Wrong input: dtype must be of kind {}, got {}'.format(['f'], np.dtype(dtype).name))
+        self.encoders = list(encoders)
+        self.n_jobs = n_jobs
+        self.dtype = np.dtype(dtype).name
+
+    def fit(self, X, y=None):
+        """Fit each encoder on given columns of X according to y.
+
+        :param pandas.DataFrame X: DataFrame of features, shape (n_samples, n_features). Must contain columns to encode.
+        :param pandas.Series y: pandas Series of target values, shape (n_samples,).
+            Required only if some encoders need it: TargetEncoder, WeightOfEvidenceEncoder
+
+        :return: None
+        """
+        for _, encoder in self.encoders:
+            encoder.fit(X, y)
+
+    def fit_transform(self, X, y=None):
+        """Fit each encoder on given columns of X according to y, and transform X in a single pass.
+
+        :rtype: pandas.DataFrame
+        """
+        self.fit(X, y)
+        return self.transform(X)
+
+    def transform(self, X, copy=True):
+        """Transform categorical data with all encoders, in a single pass.
+
+        :param pandas.DataFrame X: DataFrame of features, shape (n_samples, n_features). Must contain columns to encode.
+        :param bool copy: kept for consistency with encoders, X is never modified: the output is a new DataFrame
+            sharing untouched columns with X, only encoded columns being allocated, whatever `copy`.
+
+        :return: encoded DataFrame, each initial categorical column being replaced with the output columns of its
+            encoders, in order of encoders.
+        :rtype: pandas.DataFrame
+        """
+        for _, encoder in self.encoders:
+            encoder._check_fitted('transform')
+        layout = self._layout()
+        width = sum(len(names) for outputs in layout.values() for _, _, names, dense in outputs if dense)
+        # Fortran order, so that each output column is contiguous
+        block = np.empty((X.shape[0], width), dtype=self.dtype, order='F')
+
+        def encode_source(col):
+            values = X[col]
+            # Missing values have code -1, which takes the last position: the one of a missing value
+            codes, categories = pd.factorize(values)
+            categories = pd.Series(categories)
+            missing = pd.Series([np.nan], dtype=values.dtype if values.dtype.kind not in 'iub' else object)
+            encoded = []
+            for encoder, start, names, dense in layout[col]:
+                mapping = encoder._mapping[col]
+                positions = np.append(encoder._lookup(mapping, categories), encoder._lookup(mapping, missing))
+                out = block[:, start:start + len(names)] if dense else None
+                if out is not None and encoder._targets is None:
+                    out = out[:, 0]
+                encoded.append(encoder._encode_codes(col, positions.take(codes), values, out))
+            return encoded
+
+        cols = list(layout)
+        replacements = {}
+        for col, encoded in zip(cols, map_columns(encode_source, cols, self.n_jobs)):
+            replacements[col] = []
+            for (_, _, names, _), values in zip(layout[col], encoded):
+                columns = values.reshape(len(values), -1).T if isinstance(values, np.ndarray) else [values]
+                replacements[col].extend(zip(names, columns))
+        return replace_columns(X, replacements)
+
+    def _layout(self):
+        """Outputs of each source column, in order of columns: (encoder, first column in block, output names, whether
+        values are written in the block).
+        """
+        sources = {}
+        for name, encoder in self.encoders:
+            for col in encoder._mapping:
+                sources.setdefault(col, []).append((name, encoder))
+        layout = {}
+        start = 0
+        for col, col_encoders in sources.items():
+            layout[col] = []
+            for name, encoder in col_encoders:
+                names = [col] if encoder._targets is None else encoder._target_columns(col)
+                if len(col_encoders) > 1:
+                    names = ['{}_{}'.format(output, name) for output in names]
+                # Categorical outputs cannot be written in the block
+                dense = not getattr(encoder, 'as_category', False)
+                layout[col].append((encoder, start, names, dense))
+                start += len(names) if dense else 0
+        return layout
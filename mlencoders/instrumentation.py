@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import threading
+from contextlib import contextmanager
+from timeit import default_timer
+
+# Fields of each record, missing measurements being None
+FIELDS = ('method', 'column', 'phase', 'seconds', 'rows', 'categories', 'unseen', 'bytes')
+
+
+class Instrumentation(object):
+    """
+    Measurements of encoder calls: one record per column and phase, and one for the whole call (phase 'total').
+
+    Records are plain dicts with keys FIELDS, kept for the last call and passed to an optional callback as they are
+    made, e.g. to be sent to a metrics system. Phases of columns processed in parallel may be recorded concurrently.
+    """
+
+    def __init__(self, callback=None):
+        """Instantiation
+
+        :param callable callback: function called with each record, or None
+
+        :return: None
+        """
+        self.callback = callback
+        self.records = []
+        self._method = None
+        self._lock = threading.Lock()
+
+    def __deepcopy__(self, memo):
+        # Copies of an encoder report to the same callback, with their own records
+        return Instrumentation(self.callback)
+
+    @contextmanager
+    def call(self, method):
+        """Measure a call of a public method, dropping records of previous calls. Nested calls are part of it."""
+        if self._method is not None:
+            yield None
+            return
+        self.records = []
+        self._method = method
+        try:
+            with self.phase(None, 'total') as record:
+                yield record
+        finally:
+            self._method = None
+
+    @contextmanager
+    def phase(self, column, phase):
+        """Measure a phase of the current call, yielding its record for measurements to be added."""
+        record = dict.fromkeys(FIELDS)
+        record.update(method=self._method, column=column, phase=phase)
+        start = default_timer()
+        yield record
+        record['seconds'] = default_timer() - start
+        with self._lock:
+            self.records.append(record)
+        if self.callback is not None:
+            self.callback(record)
+
+
+class _NullContext(object):
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class _NoInstrumentation(object):
+    """Disabled instrumentation: contexts yield None instead of a record, and nothing is measured."""
+
+    records = ()
+    _context = _NullContext()
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def call(self, method):
+        return self._context
+
+    def phase(self, column, phase):
+        return self._context
+
+
+NO_INSTRUMENTATION = _NoInstrumentation()
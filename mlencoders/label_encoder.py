@@ -4,10 +4,14 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import numpy as np
 import pandas as pd
 
+from mlencoders import arrow
+from mlencoders import matrix
 from mlencoders.base_encoder import BaseEncoder
-from mlencoders.base_encoder import NAN_CATEGORY
+from mlencoders.category_mapping import CategoryMapping
+from mlencoders.category_mapping import NAN_CATEGORY
 
 
 class LabelEncoder(BaseEncoder):
@@ -15,7 +19,8 @@ class LabelEncoder(BaseEncoder):
     Target Encoder for categorical features.
     """
 
-    def __init__(self, cols=None, handle_unseen='ignore'):
+    def __init__(self, cols=None, handle_unseen='ignore', n_jobs=1, as_category=False, dtype=None, max_categories=None,
+                 min_frequency=None, n_buckets=None):
         """Instantiation
 
         :param [str] cols: list of columns to encode, or None (then all dataset columns will be encoded at fitting time)
@@ -25,22 +30,127 @@ class LabelEncoder(BaseEncoder):
         :param int min_samples: minimum samples to take category average into account, must be >= 1
         :param int smoothing: coefficient used to balance categorical average (posterior) vs prior,
             the higher this number, the higher the prior is taken into account in the average
+        :param int n_jobs: number of threads used to process columns in parallel, -1 means using all processors
+        :param bool as_category: if True, encoded columns have category dtype, whose codes are the labels and categories
+            the initial values (unseen values are missing)
+        :param dtype: integer dtype of labels, or None to pick the smallest one fitting the number of categories
+        :param int max_categories: maximum number of categories kept per column, the least frequent ones being
+            folded into a single "other" label. Unseen categories are still handled as set by `handle_unseen`.
+            None means no limit.
+        :param int min_frequency: minimum number of samples of a category to be kept, rarer ones being folded into
+            the "other" label. None means no limit.
+        :param int n_buckets: if set, categories are hashed into this number of buckets, labels being bucket numbers.
+            Memory and file size do not depend on the number of categories, but categories falling into the same
+            bucket get the same label (see `collision_stats`).
 
         :return: None
         """
         self._input_check('handle_unseen', handle_unseen, ['error', 'ignore'])
-        super(LabelEncoder, self).__init__(cols, handle_unseen, 1, NAN_CATEGORY)
+        self._dtype_check(dtype, 'iuf')
+        super(LabelEncoder, self).__init__(cols, handle_unseen, 1, NAN_CATEGORY, n_jobs, dtype, max_categories,
+                                           min_frequency, n_buckets)
+        self.as_category = as_category
 
-    def fit(self, X, y=None):
-        """Label Encode given columns of X.
+    def _encode_codes(self, col, codes, values, out=None):
+        encoded = super(LabelEncoder, self)._encode_codes(col, codes, values, out)
+        if not self.as_category:
+            return encoded
+        codes = np.where(np.isnan(encoded), -1, encoded).astype(np.int64)
+        return pd.Categorical.from_codes(codes, categories=self._mapping[col].index)
+
+    def _stable_chunk(self, chunk):
+        # Labels of ignored unseen categories are missing, which integer labels cannot hold: chunks with unseen
+        # categories would have float labels, others integer ones. Nullable integers hold both.
+        if self.as_category or self.handle_unseen != 'ignore':
+            return chunk
+        dtypes = {col: pd.array(mapping.values[:0]).dtype for col, mapping in self._mapping.items()
+                  if mapping.values.dtype.kind in 'iu'}
+        if not arrow.is_arrow(chunk):
+            return chunk.astype(dtypes)
+        return arrow.replace_columns(chunk, {
+            col: [(col, pd.array(np.asarray(chunk.column(chunk.schema.get_field_index(col))), dtype=dtype))]
+            for col, dtype in dtypes.items()})
+
+    def transform_one_hot(self, X, cols=None, dtype=np.float64):
+        """One-hot encode categorical data, as a sparse matrix built directly from labels. Requires scipy.
 
         :param pandas.DataFrame X: DataFrame of features, shape (n_samples, n_features). Must contain columns to encode.
+            Can also be a pyarrow Table or RecordBatch, a 2-D NumPy array or a scipy.sparse matrix (columns being
+            designated by their index).
+        :param [str] cols: columns to encode, among those learnt at fitting time, or None to encode all of them
+        :param dtype: dtype of non-zero entries
 
-        :return: None
+        :return: one-hot encoded columns only, of shape (n_samples, total number of labels): for each column in turn,
+            one column per label (see `_mapping[col].index` for their categories). Unseen categories have no non-zero
+            entry if they are ignored.
+        :rtype: scipy.sparse.csr_matrix
         """
-        self._before_fit_check(X, y)
-        for col in self.cols:
-            self._mapping[col] = pd.Series(pd.unique(X[col].fillna(NAN_CATEGORY)), name=col)\
-                .reset_index()\
-                .rename(columns={'index': 'value'})\
-                .set_index(col)
+        with self._instrumentation.call('transform_one_hot') as record:
+            self._check_fitted('transform_one_hot')
+            cols = list(self._mapping) if cols is None else list(cols)
+            frame, _ = self._as_pandas(X, cols=cols)
+            assert all(c in self._mapping and c in frame.columns for c in cols)
+            if record is not None:
+                record['rows'] = frame.shape[0]
+
+            def col_labels(col):
+                values = frame[col]
+                codes = self._lookup(self._mapping[col], values)
+                # Labels whatever `as_category`, NaN for ignored unseen categories
+                return super(LabelEncoder, self)._encode_codes(col, codes, values)
+
+            labels = self._map_columns(col_labels, cols)
+            return matrix.one_hot(labels, [len(self._mapping[col]) for col in cols], dtype)
+
+    def _accumulate(self, X, y):
+        def col_mapping(col):
+            with self._instrumentation.phase(col, 'factorize') as record:
+                codes, categories = self._factorize(X[col], sort=False)
+                if record is not None:
+                    record.update(rows=len(codes), categories=len(categories), bytes=codes.nbytes)
+            with self._instrumentation.phase(col, 'accumulate') as record:
+                mapping = self._append_categories(col, categories.values, np.bincount(codes, minlength=len(categories)))
+                if record is not None:
+                    record.update(rows=len(codes), categories=len(mapping), bytes=mapping.stats.nbytes)
+                return mapping
+
+        self._set_accumulated(zip(self.cols, self._map_columns(col_mapping, self.cols)))
+
+    def _merge(self, other):
+        mappings = []
+        for col in list(other._mapping):
+            mapping = other._accumulated(col)
+            mappings.append((col, self._append_categories(col, mapping.keys, mapping.stats[:, 0])))
+        self._set_accumulated(mappings)
+
+    def _append_categories(self, col, categories, counts):
+        # Categories are numbered in order of first appearance, new ones are appended after those already seen.
+        # Counts of all categories are kept, rare ones being folded only when labels are derived (see `_finalize`).
+        counts = np.asarray(counts, dtype=float)[:, None]
+        mapping = self._accumulated(col)
+        folded = None
+        if mapping is None:
+            keys, stats = categories, counts
+        else:
+            folded = mapping.folded
+            positions = mapping.index.get_indexer(categories)
+            new = positions == -1
+            keys = np.concatenate([mapping.keys, categories[new]])
+            stats = np.concatenate([mapping.stats, counts[new]])
+            stats[positions[~new]] += counts[~new]
+        return CategoryMapping(keys, stats=stats, stat_names=('count',), folded=folded)
+
+    def _build_mapping(self):
+        for col, mapping in list(self._mapping.items()):
+            self._mapping[col] = mapping.with_values(np.arange(len(mapping), dtype=self._labels_dtype(len(mapping))))
+
+    def _labels_dtype(self, n_labels):
+        if self.dtype is not None:
+            dtype = np.dtype(self.dtype)
+            if dtype.kind in 'iu' and n_labels > np.iinfo(dtype).max + 1:
+                raise ValueError('{} labels cannot be held by dtype {}.'.format(n_labels, dtype.name))
+            return self.dtype
+        for dtype in (np.int8, np.int16, np.int32):
+            if n_labels <= np.iinfo(dtype).max + 1:
+                return dtype
+        return np.int64
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import threading
+from collections import OrderedDict
+
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    from collections import MutableMapping
+
+import numpy as np
+
+from mlencoders.category_mapping import CategoryMapping
+from mlencoders.category_mapping import NAN_CATEGORY
+
+
+def load_column(path, position, column, mmap_mode='r'):
+    """Load the mapping of a column from files written by `BaseEncoder.save_as_npy_files`.
+
+    :param str path: directory where files were written
+    :param int position: position of the column in the header, which prefixes the names of its files
+    :param dict column: description of the column in the header
+    :param str mmap_mode: mode used to memory-map arrays (see `numpy.load`), None to load them in memory
+
+    :rtype: CategoryMapping
+    """
+    def load(array):
+        return _load_npy(os.path.join(path, '{}.{}.npy'.format(position, array)), mmap_mode)
+
+    def load_keys(name, offsets_name, description):
+        keys = load(name)
+        if description.get('utf8_keys'):
+            keys = _decode_strings(keys, load(offsets_name))
+        if description['nan_position'] is not None:
+            keys = np.insert(keys.astype(object), description['nan_position'], NAN_CATEGORY)
+        return keys
+
+    keys = load_keys('keys', 'key_offsets', column)
+    stats = load('stats') if column['has_stats'] else None
+    # Files written by previous versions do not hold categories folded into OTHER_CATEGORY
+    folded = load_keys('folded', 'folded_offsets', column['folded']) if column.get('folded') else None
+    return CategoryMapping(keys, load('values'), stats, column['stat_names'], folded)
+
+
+def _decode_strings(data, offsets):
+    # Strings stored as their concatenated UTF-8 bytes, and the offset of each one in them
+    data = data.tobytes()
+    offsets = offsets.tolist()
+    return np.array([data[start:end].decode('utf-8') for start, end in zip(offsets[:-1], offsets[1:])], dtype=object)
+
+
+def _load_npy(path, mmap_mode):
+    try:
+        return np.load(path, mmap_mode=mmap_mode)
+    except ValueError:
+        # Object arrays cannot be memory-mapped
+        return np.load(path, allow_pickle=True)
+
+
+class LazyMapping(MutableMapping):
+    """
+    Mapping {column name: CategoryMapping} loading the mapping of each column on first access, from files written by
+    `BaseEncoder.save_as_npy_files`.
+
+    At most `max_resident` loaded columns are kept in memory, least recently used ones being dropped and loaded again
+    on next access. Mappings assigned after loading (e.g. by `update`) are not on disk, and are always kept.
+    Columns may be accessed from several threads.
+    """
+
+    def __init__(self, path, columns, mmap_mode='r', max_resident=None):
+        """Instantiation
+
+        :param str path: directory where files were written
+        :param [dict] columns: description of each column in the header
+        :param str mmap_mode: mode used to memory-map arrays (see `numpy.load`), None to load them in memory
+        :param int max_resident: maximum number of loaded columns kept in memory, None means no limit
+
+        :return: None
+        """
+        if max_resident is not None and max_resident < 1:
+            raise ValueError('max_resident must be >= 1, got {}.'.format(max_resident))
+        self.path = path
+        self.mmap_mode = mmap_mode
+        self.max_resident = max_resident
+        # Column name --> (position, description) of columns on disk, in order of the header
+        self._columns = OrderedDict((column['name'], (i, column)) for i, column in enumerate(columns))
+        # Loaded columns, from least to most recently used
+        self._resident = OrderedDict()
+        # Columns assigned since loading, kept in memory
+        self._assigned = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def resident(self):
+        """Names of columns loaded from disk and currently kept in memory, from least to most recently used.
+
+        :rtype: [str]
+        """
+        with self._lock:
+            return list(self._resident)
+
+    @property
+    def assigned(self):
+        """Mappings assigned since loading, {column name: CategoryMapping}.
+
+        :rtype: dict
+        """
+        return self._assigned
+
+    def __getitem__(self, col):
+        if col in self._assigned:
+            return self._assigned[col]
+        with self._lock:
+            if col in self._resident:
+                mapping = self._resident.pop(col)
+                self._resident[col] = mapping
+                return mapping
+        position, column = self._columns[col]
+        # Loading outside of the lock, for other columns to be accessed meanwhile
+        mapping = load_column(self.path, position, column, self.mmap_mode)
+        with self._lock:
+            self._resident[col] = mapping
+            while self.max_resident is not None and len(self._resident) > self.max_resident:
+                self._resident.popitem(last=False)
+        return mapping
+
+    def __setitem__(self, col, mapping):
+        with self._lock:
+            self._resident.pop(col, None)
+        self._assigned[col] = mapping
+
+    def __delitem__(self, col):
+        if col not in self:
+            raise KeyError(col)
+        with self._lock:
+            self._resident.pop(col, None)
+        self._columns.pop(col, None)
+        self._assigned.pop(col, None)
+
+    def __contains__(self, col):
+        # Without loading the column
+        return col in self._columns or col in self._assigned
+
+    def __iter__(self):
+        for col in self._columns:
+            yield col
+        for col in self._assigned:
+            if col not in self._columns:
+                yield col
+
+    def __len__(self):
+        return len(self._columns) + sum(col not in self._columns for col in self._assigned)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+NumPy 2-D arrays and scipy.sparse matrices as inputs and outputs, scipy being an optional dependency.
+
+Columns of matrices are designated by their index. Only columns to encode are handed to encoders, as a pandas DataFrame,
+other columns are passed through to the output without conversion.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import numpy as np
+import pandas as pd
+
+try:
+    import scipy.sparse as sp
+except ImportError:
+    sp = None
+
+
+def is_matrix(data):
+    """Whether data is a 2-D NumPy array or a scipy.sparse matrix.
+
+    :rtype: bool
+    """
+    return (isinstance(data, np.ndarray) and data.ndim == 2) or (sp is not None and sp.issparse(data))
+
+
+def to_frame(X, cols=None):
+    """Given columns of a matrix as a pandas DataFrame, whose column names are their indices.
+
+    :param X: numpy.ndarray or scipy.sparse matrix, of shape (n_samples, n_features)
+    :param [int] cols: indices of columns to convert, None for all columns
+
+    :rtype: pandas.DataFrame
+    """
+    cols = list(range(X.shape[1])) if cols is None else [int(col) for col in cols]
+    if sp is not None and sp.issparse(X):
+        # Implicit zeros are values like any other. Columns are sliced once in a column-major format.
+        dense = sp.csc_matrix(X)[:, cols].toarray()
+        columns = [dense[:, i] for i in range(len(cols))]
+    else:
+        columns = [X[:, col] for col in cols]
+    return pd.DataFrame(dict(zip(cols, columns)), columns=cols)
+
+
+def replace_columns(X, replacements, copy=True):
+    """Matrix with some columns replaced, of the same type and sparse format as X.
+
+    :param X: numpy.ndarray or scipy.sparse matrix, of shape (n_samples, n_features)
+    :param dict replacements: {column index: [(new name, numpy.ndarray or pandas.Categorical), ...]}, each column
+        being replaced with one or several arrays, in its place. Names are ignored, categoricals are replaced with
+        their codes, missing values with NaN.
+    :param bool copy: if False, a dense X is updated in place when it can hold new values without changing shape
+
+    :rtype: numpy.ndarray or scipy.sparse matrix, like X
+    """
+    replacements = {col: [_to_array(values) for _, values in items] for col, items in replacements.items()}
+    if sp is not None and sp.issparse(X):
+        return _replace_sparse_columns(X, replacements)
+    if all(len(arrays) == 1 for arrays in replacements.values()):
+        dtype = np.result_type(X.dtype, *[arrays[0].dtype for arrays in replacements.values()])
+        out = X if not copy and dtype == X.dtype else X.astype(dtype)
+        for col, (values,) in replacements.items():
+            out[:, col] = values
+        return out
+    # Some columns are replaced with several, e.g. one per target
+    columns = []
+    for col in range(X.shape[1]):
+        columns.extend(replacements.get(col, [X[:, col]]))
+    return np.column_stack(columns)
+
+
+def _replace_sparse_columns(X, replacements):
+    # Unchanged ranges of columns are kept as sparse blocks, replaced columns are stacked in between
+    csc = sp.csc_matrix(X)
+    blocks, start = [], 0
+    for col in sorted(replacements):
+        if col > start:
+            blocks.append(csc[:, start:col])
+        blocks.extend(sp.csc_matrix(values[:, None]) for values in replacements[col])
+        start = col + 1
+    if start < X.shape[1]:
+        blocks.append(csc[:, start:])
+    return sp.hstack(blocks, format=X.format)
+
+
+def _to_array(values):
+    if isinstance(values, pd.Categorical):
+        return np.where(values.codes == -1, np.nan, values.codes)
+    return np.asarray(values)
+
+
+def one_hot(labels, n_categories, dtype=np.float64):
+    """CSR matrix of one-hot encoded columns, built from their labels without any dense intermediate.
+
+    :param [numpy.ndarray] labels: labels of each column, in [0, n_categories), NaN for missing values (then the row
+        has no non-zero entry for this column), each of shape (n_samples,)
+    :param [int] n_categories: number of categories of each column, the one-hot columns of each column following those
+        of the previous one
+    :param dtype: dtype of non-zero entries
+
+    :rtype: scipy.sparse.csr_matrix
+    """
+    if sp is None:
+        raise ImportError('scipy is required for sparse outputs.')
+    n_rows = len(labels[0]) if len(labels) else 0
+    n_columns = int(np.sum(n_categories))
+    index_dtype = np.int32 if n_columns < np.iinfo(np.int32).max else np.int64
+    offsets = np.concatenate([[0], np.cumsum(n_categories)[:-1]]).astype(index_dtype)
+    # Rows are laid out in C order, so that non-zero entries come sorted by row, then by column
+    indices = np.empty((n_rows, len(labels)), dtype=index_dtype)
+    valid = np.ones((n_rows, len(labels)), dtype=bool)
+    for i, (col_labels, offset) in enumerate(zip(labels, offsets)):
+        col_labels = np.asarray(col_labels)
+        if col_labels.dtype.kind == 'f':
+            valid[:, i] = ~np.isnan(col_labels)
+            col_labels = np.where(valid[:, i], col_labels, 0)
+        np.add(col_labels, offset, out=indices[:, i], casting='unsafe')
+    if valid.all():
+        indices = indices.ravel()
+        indptr = np.arange(n_rows + 1, dtype=index_dtype) * len(labels)
+    else:
+        indices = indices[valid]
+        indptr = np.concatenate([[0], np.cumsum(valid.sum(axis=1))]).astype(index_dtype)
+    data = np.ones(len(indices), dtype=dtype)
+    return sp.csr_matrix((data, indices, indptr), shape=(n_rows, n_columns))
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Chunked reading and writing of CSV and Parquet files, and background production of chunks, for out-of-core transforms.
+
+Parquet files require pyarrow.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+import pandas as pd
+
+from mlencoders import arrow
+
+FORMATS = ('csv', 'parquet')
+
+
+def infer_format(path):
+    """Format of a file from its extension, Parquet for directories (datasets of Parquet files).
+
+    :param str path: file or directory
+
+    :rtype: str
+    """
+    name = path.lower()
+    for compression in ('.gz', '.bz2', '.zip', '.xz'):
+        if name.endswith(compression):
+            name = name[:-len(compression)]
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.parquet', '.pq')) or os.path.isdir(path):
+        return 'parquet'
+    raise ValueError('Cannot infer the format of {}, expected one of {}.'.format(path, FORMATS))
+
+
+def read_chunks(path, chunksize, file_format=None, csv_options=None):
+    """Chunks of a file, read one at a time: DataFrames for CSV files, Arrow record batches for Parquet files.
+
+    :param str path: input file, or directory of Parquet files
+    :param int chunksize: maximum number of rows of each chunk
+    :param str file_format: 'csv' or 'parquet', None to infer it from the extension
+    :param dict csv_options: keyword arguments of `pandas.read_csv`, e.g. dtype of columns to read
+
+    :rtype: iterator
+    """
+    file_format = file_format or infer_format(path)
+    if file_format == 'csv':
+        return iter(pd.read_csv(path, chunksize=chunksize, **(csv_options or {})))
+    return arrow.iter_parquet(path, batch_size=chunksize)
+
+
+def write_chunks(chunks, path, file_format=None):
+    """Write chunks one at a time to a single file.
+
+    :param iterable chunks: DataFrames, or Arrow tables or record batches, all with the same columns
+    :param str path: output file
+    :param str file_format: 'csv' or 'parquet', None to infer it from the extension
+
+    :return: number of rows written
+    :rtype: int
+    """
+    file_format = file_format or infer_format(path)
+    n_rows = 0
+    if file_format == 'csv':
+        for i, chunk in enumerate(chunks):
+            chunk = chunk.to_pandas() if arrow.is_arrow(chunk) else chunk
+            chunk.to_csv(path, index=False, mode='w' if i == 0 else 'a', header=i == 0)
+            n_rows += chunk.shape[0]
+        return n_rows
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, pd.DataFrame):
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+            else:
+                table = pa.Table.from_batches([chunk]) if isinstance(chunk, pa.RecordBatch) else chunk
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            elif table.schema != writer.schema:
+                # E.g. integer values of a chunk written in a column of floats. Encoders give columns of the same
+                # type in all chunks (see `BaseEncoder._stable_chunk`).
+                table = table.cast(writer.schema)
+            writer.write_table(table)
+            n_rows += table.num_rows
+    finally:
+        if writer is not None:
+            writer.close()
+    return n_rows
+
+
+def prefetch(iterable, size=1):
+    """Items of an iterable, the next ones being produced by a background thread while the current one is used.
+
+    Items are produced in order, at most `size` of them waiting to be used. An error raised while producing an item is
+    raised in place of it.
+
+    :param iterable iterable: items to produce, e.g. chunks read from a file
+    :param int size: maximum number of items produced in advance, 0 to produce them in the calling thread
+
+    :rtype: iterator
+    """
+    if size < 1:
+        for item in iterable:
+            yield item
+        return
+    items = queue.Queue(maxsize=size)
+    stopped = threading.Event()
+
+    def put(entry):
+        # Giving up when the consumer stops, not to block on a full queue forever
+        while not stopped.is_set():
+            try:
+                items.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((True, item)):
+                    return
+        except Exception as e:
+            put((False, e))
+            return
+        put((False, None))
+
+    thread = threading.Thread(target=produce)
+    thread.daemon = True
+    thread.start()
+    try:
+        while True:
+            is_item, item = items.get()
+            if not is_item:
+                if item is not None:
+                    raise item
+                return
+            yield item
+    finally:
+        stopped.set()
+        thread.join()
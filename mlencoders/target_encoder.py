@@ -5,9 +5,10 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import numpy as np
+import pandas as pd
 
 from mlencoders.base_encoder import BaseEncoder
-from mlencoders.base_encoder import NAN_CATEGORY
+from mlencoders.category_mapping import CategoryMapping
 
 
 class TargetEncoder(BaseEncoder):
@@ -15,7 +16,8 @@ class TargetEncoder(BaseEncoder):
     Target Encoder for categorical features.
     """
 
-    def __init__(self, cols=None, handle_unseen='impute', min_samples=1, smoothing=1):
+    def __init__(self, cols=None, handle_unseen='impute', min_samples=1, smoothing=1, n_jobs=1, dtype=np.float64,
+                 max_categories=None, min_frequency=None, n_buckets=None, multiclass=False):
         """Instantiation
 
         :param [str] cols: list of columns to encode, or None (then all dataset columns will be encoded at fitting time)
@@ -26,26 +28,158 @@ class TargetEncoder(BaseEncoder):
         :param int min_samples: minimum samples to take category average into account, must be >= 1
         :param int smoothing: coefficient used to balance categorical average (posterior) vs prior,
             the higher this number, the higher the prior is taken into account in the average
+        :param int n_jobs: number of threads used to process columns in parallel, -1 means using all processors
+        :param dtype: dtype of encoded columns, e.g. numpy.float32 to halve memory
+        :param int max_categories: maximum number of categories kept per column, the least frequent ones being
+            folded into a single "other" category. Unseen categories are still handled as set by `handle_unseen`.
+            None means no limit.
+        :param int min_frequency: minimum number of samples of a category to be kept, rarer ones being folded into
+            the "other" category. None means no limit.
+        :param int n_buckets: if set, categories are hashed into this number of buckets, whose statistics are learnt
+            instead of those of each category. Memory and file size do not depend on the number of categories, but
+            categories falling into the same bucket get the same value (see `collision_stats`).
+        :param bool multiclass: if True, y holds class labels, and each column is encoded as the frequency of each
+            class among samples of the category (one column per class). Classes are those seen in the first chunk.
+            Several targets can also be encoded at once by passing y as a DataFrame.
 
         :return: None
         """
         self._input_check('handle_unseen', handle_unseen, ['impute', 'error', 'ignore'])
-        super(TargetEncoder, self).__init__(cols, handle_unseen, min_samples, None)
+        # Averages are fractional, integer dtypes would truncate them
+        self._dtype_check(dtype, 'f')
+        super(TargetEncoder, self).__init__(cols, handle_unseen, min_samples, None, n_jobs, dtype, max_categories,
+                                            min_frequency, n_buckets)
         self.smoothing = smoothing
+        self.multiclass = multiclass
 
-    def fit(self, X, y):
-        """Encode given columns of X according to y.
+    def _before_fit_check(self, X, y):
+        super(TargetEncoder, self)._before_fit_check(X, y)
+        # Targets are learnt all at once, from a DataFrame of targets or from the classes of a multiclass target
+        if isinstance(y, pd.DataFrame):
+            targets = list(y.columns)
+        elif self.multiclass:
+            # Missing targets are not a class, those samples are left out
+            values = np.asarray(y)
+            targets = np.unique(values[pd.notna(values)]).tolist()
+        else:
+            targets = None
+        if self._targets is None and not self._mapping:
+            self._targets = targets
+        elif self.multiclass and targets is not None:
+            unknown = sorted(set(targets) - set(self._targets))
+            if unknown:
+                raise ValueError('Classes unseen in the first chunk: {}.'.format(unknown))
+        elif targets != self._targets:
+            raise ValueError('Targets {} differ from those of the first chunk {}.'.format(targets, self._targets))
 
-        :param pandas.DataFrame X: DataFrame of features, shape (n_samples, n_features). Must contain columns to encode.
-        :param pandas.Series y: pandas Series of target values, shape (n_samples,).
+    def _prepare_targets(self, y):
+        if not self.multiclass:
+            return super(TargetEncoder, self)._prepare_targets(y)
+        # Class of each sample, as its position among classes, -1 for missing targets
+        classes = pd.Index(self._targets).get_indexer(np.asarray(y))
+        missing = classes == -1
+        if not missing.any():
+            return classes, None
+        return np.where(missing, 0, classes), (~missing).astype(float)
+
+    def _target_sums(self, codes, n_categories, y, weights):
+        if not self.multiclass:
+            return super(TargetEncoder, self)._target_sums(codes, n_categories, y, weights)
+        # Counts of (category, class) pairs, in a single pass instead of one per class
+        n_classes = len(self._targets)
+        pair_counts = np.bincount(codes * n_classes + y, weights=weights, minlength=n_categories * n_classes)
+        return pair_counts.reshape(n_categories, n_classes).astype(float)
+
+    def _build_mapping(self):
+        # Prior, from the statistics of any column: they all sum over the same samples
+        totals = next(iter(self._mapping.values())).stats.sum(axis=0)
+        total_sum, total_count = totals[:-1], totals[-1]
+        self._imputed = self._squeeze_targets(total_sum / total_count)
+        for col, mapping in list(self._mapping.items()):
+            values = self._values_from_stats(mapping.stats[:, :-1], mapping.stats[:, -1:], total_sum, total_count)
+            self._mapping[col] = mapping.with_values(self._squeeze_targets(values).astype(self.dtype, copy=False))
+
+    def update(self, X, y, decay=None):
+        """Add new observations to the statistics of a fitted encoder, without processing previous data again.
+
+        Values are derived again only for categories found in X, so that cost is proportional to new data. Other
+        categories keep their values, though the prior moved and their statistics decayed. A full derivation of all
+        values happens on the next `partial_fit`.
+
+        :param pandas.DataFrame X: DataFrame of new features, shape (n_samples, n_features). Must contain columns to
+            encode.
+        :param pandas.Series y: pandas Series of new target values, shape (n_samples,).
+        :param float decay: factor in (0, 1] applied to previous sums and counts before adding new observations, so that
+            old observations weigh exponentially less at each update. None means no decay.
 
         :return: None
         """
-        self._before_fit_check(X, y)
-        self._imputed = y.mean()
-        for col in self.cols:
-            mapping = y.groupby(X[col].fillna(NAN_CATEGORY)).agg(['mean', 'count'])
-            corr_count = mapping['count'] - self.min_samples
-            coef = (corr_count > 0) / (1 + np.exp(-corr_count / self.smoothing))
-            mapping['value'] = self._imputed * (1 - coef) + mapping['mean'] * coef
-            self._mapping[col] = mapping
+        if decay is not None and not 0 < decay <= 1:
+            raise ValueError('Wrong input: decay parameter must be in (0, 1], got {}'.format(decay))
+        with self._instrumentation.call('update') as record:
+            self._check_fitted('update')
+            X, y = self._as_pandas(X, y)
+            self._before_fit_check(X, y)
+            if record is not None:
+                record['rows'] = X.shape[0]
+            y = self._prepare_targets(y)
+            # Totals are the same for all columns, as they sum over the same samples
+            totals = next(iter(self._mapping.values())).stats.sum(axis=0)
+            if decay is not None:
+                totals *= decay
+            totals += self._target_stats(np.zeros(X.shape[0], dtype=np.intp), 1, y)[0]
+            total_sum, total_count = totals[:-1], totals[-1]
+
+            self._mapping.update(zip(self.cols, self._map_columns(
+                lambda col: self._update_column(col, X[col], y, decay, total_sum, total_count), self.cols)))
+            if self._unfolded:
+                # Statistics before folding are updated too, categories being folded again on the next derivation
+                self._unfolded.update(zip(self.cols, self._map_columns(
+                    lambda col: self._update_unfolded(col, X[col], y, decay), self.cols)))
+            self._imputed = self._squeeze_targets(total_sum / total_count)
+            self._mapping_changed()
+
+    def _update_column(self, col, values, y, decay, total_sum, total_count):
+        with self._instrumentation.phase(col, 'update') as record:
+            mapping = self._mapping[col]
+            codes = self._hash(values) if self.n_buckets is not None else self._lookup(mapping, values)
+            stats = mapping.stats * decay if decay is not None else mapping.stats.copy()
+            encoded = mapping.values.copy()
+            keys = mapping.keys
+            new = codes == -1
+            if new.any():
+                # New categories are appended after known ones
+                new_codes, categories = self._factorize(values[new])
+                codes[new] = new_codes + len(keys)
+                keys = np.concatenate([keys, categories.values])
+                stats = np.concatenate([stats, np.zeros((len(categories), stats.shape[1]))])
+                encoded = np.concatenate([encoded, np.zeros((len(categories),) + encoded.shape[1:], encoded.dtype)])
+            stats += self._target_stats(codes, len(keys), y)
+            touched = pd.unique(codes)
+            touched_values = self._values_from_stats(stats[touched, :-1], stats[touched, -1:], total_sum, total_count)
+            encoded[touched] = self._squeeze_targets(touched_values)
+            if record is not None:
+                record.update(rows=len(codes), categories=len(touched), bytes=stats.nbytes)
+            if new.any():
+                return CategoryMapping(keys, encoded, stats, mapping.stat_names, mapping.folded)
+            # Same categories: lookup structures are kept
+            updated = mapping.with_values(encoded)
+            updated.stats = stats
+            return updated
+
+    def _update_unfolded(self, col, values, y, decay):
+        mapping = self._unfolded[col]
+        codes, categories = self._factorize(values)
+        stats = self._target_stats(codes, len(categories), y)
+        previous = CategoryMapping(mapping.keys, stats=mapping.stats * decay, stat_names=mapping.stat_names) \
+            if decay is not None else mapping
+        return self._merge_mappings([previous, CategoryMapping(categories.values, stats=stats,
+                                                               stat_names=mapping.stat_names)])
+
+    def _values_from_stats(self, sums, counts, total_sum, total_count):
+        """Smoothed average of target for categories with given target sums and counts, and given prior totals."""
+        prior = total_sum / total_count
+        corr_count = counts - self.min_samples
+        coef = (corr_count > 0) / (1 + np.exp(-corr_count / self.smoothing))
+        # Categories without samples get the prior, since their coef is 0
+        return prior * (1 - coef) + sums / np.maximum(counts, 1) * coef
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+def fingerprint(values):
+    """Digest of the content of a column, equal for columns of equal values and dtype.
+
+    Numeric columns are digested from their raw bytes, categoricals from their codes and categories, and other columns
+    from the hash of each value (see `pandas.util.hash_pandas_object`).
+
+    :param pandas.Series values: column values
+
+    :rtype: bytes
+    """
+    values = values.values if isinstance(values, pd.Series) else values
+    digest = hashlib.sha1('{}:{}'.format(values.dtype, len(values)).encode('utf-8'))
+    if isinstance(values, pd.Categorical):
+        digest.update(np.ascontiguousarray(values.codes).view(np.uint8))
+        values = np.asarray(values.categories)
+    if isinstance(values, np.ndarray) and values.dtype != object:
+        data = np.ascontiguousarray(values)
+    else:
+        data = pd.util.hash_pandas_object(pd.Series(values, copy=False), index=False).values
+    digest.update(data.view(np.uint8))
+    return digest.digest()
+
+
+class TransformCache(object):
+    """
+    Encoded columns of previous transform calls, with least recently used ones evicted beyond a size bound.
+
+    Keys are given by the encoder, including the content fingerprint of the column and the version of its mapping.
+    Cached arrays are never handed out, only copies of them, so that outputs can be modified freely.
+    Columns may be cached from several threads.
+    """
+
+    def __init__(self, max_bytes):
+        """Instantiation
+
+        :param int max_bytes: maximum total size of cached arrays, in bytes
+
+        :return: None
+        """
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        # Key --> encoded column, from least to most recently used
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __deepcopy__(self, memo):
+        # Copies of an encoder have their own, empty, cache
+        return TransformCache(self.max_bytes)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Copy of the encoded column cached under key, or None."""
+        with self._lock:
+            encoded = self._entries.pop(key, None)
+            if encoded is None:
+                self.misses += 1
+                return None
+            self._entries[key] = encoded
+            self.hits += 1
+        return encoded.copy()
+
+    def put(self, key, encoded):
+        """Cache a copy of an encoded column, unless it is larger than the bound."""
+        size = _nbytes(encoded)
+        if size > self.max_bytes:
+            return
+        encoded = encoded.copy()
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.nbytes -= _nbytes(previous)
+            self._entries[key] = encoded
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= _nbytes(evicted)
+
+    def clear(self):
+        """Drop all cached columns."""
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+
+def _nbytes(encoded):
+    # Categorical columns are stored as codes, and categories shared with the mapping
+    return encoded.codes.nbytes if isinstance(encoded, pd.Categorical) else encoded.nbytes
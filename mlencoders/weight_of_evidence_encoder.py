@@ -5,9 +5,9 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import numpy as np
+import pandas as pd
 
 from mlencoders.base_encoder import BaseEncoder
-from mlencoders.base_encoder import NAN_CATEGORY
 
 
 class WeightOfEvidenceEncoder(BaseEncoder):
@@ -21,7 +21,8 @@ class WeightOfEvidenceEncoder(BaseEncoder):
 
     """
 
-    def __init__(self, cols=None, handle_unseen='impute', min_samples=1):
+    def __init__(self, cols=None, handle_unseen='impute', min_samples=1, n_jobs=1, dtype=np.float64,
+                 max_categories=None, min_frequency=None, n_buckets=None):
         """Instantiation
 
         :param [str] cols: list of columns to encode, or None (then all dataset columns will be encoded at fitting time)
@@ -30,29 +31,81 @@ class WeightOfEvidenceEncoder(BaseEncoder):
             'error'  - raise an error if a category unseen at fitting time is found
             'ignore' - skip unseen categories
         :param int min_samples: minimum samples to compute WOE of category, must be >= 1.
+        :param int n_jobs: number of threads used to process columns in parallel, -1 means using all processors
+        :param dtype: dtype of encoded columns, e.g. numpy.float32 to halve memory
+        :param int max_categories: maximum number of categories kept per column, the least frequent ones being
+            folded into a single "other" category. Unseen categories are still handled as set by `handle_unseen`.
+            None means no limit.
+        :param int min_frequency: minimum number of samples of a category to be kept, rarer ones being folded into
+            the "other" category. None means no limit.
+        :param int n_buckets: if set, categories are hashed into this number of buckets, whose statistics are learnt
+            instead of those of each category. Memory and file size do not depend on the number of categories, but
+            categories falling into the same bucket get the same value (see `collision_stats`).
 
         :return: None
         """
         self._input_check('handle_unseen', handle_unseen, ['impute', 'error', 'ignore'])
-        super(WeightOfEvidenceEncoder, self).__init__(cols, handle_unseen, min_samples, 0)
+        # Logarithms are fractional, integer dtypes would truncate them
+        self._dtype_check(dtype, 'f')
+        super(WeightOfEvidenceEncoder, self).__init__(cols, handle_unseen, min_samples, 0, n_jobs, dtype,
+                                                      max_categories, min_frequency, n_buckets)
 
-    def fit(self, X, y):
-        """Encode given columns of X according to y.
+    def _before_fit_check(self, X, y):
+        super(WeightOfEvidenceEncoder, self)._before_fit_check(X, y)
+        # Weight of evidence is defined for a single binary target
+        if isinstance(y, pd.DataFrame) or np.ndim(y) > 1:
+            raise ValueError('Weight of evidence requires a single binary target, got a target of shape {}.'.format(
+                np.shape(y)))
 
-        :param pandas.DataFrame X: DataFrame of features, shape (n_samples, n_features). Must contain columns to encode.
-        :param pandas.Series y: pandas Series of target values, shape (n_samples,).
+    def _build_mapping(self):
+        total_pos, total_count = next(iter(self._mapping.values())).stats.sum(axis=0)
+        for col, mapping in list(self._mapping.items()):
+            values = self._values_from_stats(mapping.stats[:, 0], mapping.stats[:, 1], total_pos, total_count)
+            self._mapping[col] = mapping.with_values(values.astype(self.dtype, copy=False))
 
-        :return: None
+    @property
+    def information_value_(self):
+        """Information Value of each encoded column, IV = sum_i (P(X=X_i | Y=1) - P(X=X_i | Y=0)) * WOE_i.
+
+        Derived from statistics accumulated at fitting time, so it costs no pass over data, including after chunked
+        or merged fits. Categories whose WOE is undefined (see `min_samples`) do not contribute.
+
+        :rtype: pandas.Series
+        """
+        self._check_fitted('information_value_')
+        return pd.Series([self.woe_table(col)['iv'].sum() for col in self._mapping], index=list(self._mapping))
+
+    def woe_table(self, col):
+        """Per-category diagnostics of an encoded column, from statistics accumulated at fitting time.
+
+        :param str col: encoded column
+
+        :return: DataFrame indexed by category, with columns
+            count     - number of samples
+            pos, neg  - number of positive and negative samples
+            pos_share - share of positive samples in the category, P(X=X_i | Y=1)
+            neg_share - share of negative samples in the category, P(X=X_i | Y=0)
+            woe       - weight of evidence
+            iv        - contribution to the Information Value of the column
+        :rtype: pandas.DataFrame
         """
-        self._before_fit_check(X, y)
-        for col in self.cols:
-            # Share of positive (resp. negative) labels for each category P(X=X_i | Y=1) (resp. P(X=X_i | Y=0))
-            mapping = y.groupby(X[col].fillna(NAN_CATEGORY)).agg(['sum', 'count']).rename({'sum': 'pos'}, axis=1)
-            mapping['neg'] = mapping['count'] - mapping['pos']
-            mapping[['pos', 'neg']] /= mapping[['pos', 'neg']].sum()
-            # For corner cases, defaulting to WOE = 0 (meaning no info). To avoid division by 0 we use default values.
-            undef = (mapping['count'] < self.min_samples) | (mapping['pos'] == 0) | (mapping['neg'] == 0)
-            mapping.loc[undef, ['pos', 'neg']] = -1
-            # Final step, log of ratio of probabily estimates
-            mapping['value'] = np.log(mapping['pos'] / mapping['neg'])
-            self._mapping[col] = mapping
+        self._check_fitted('woe_table')
+        mapping = self._mapping[col]
+        pos, counts = mapping.stats[:, 0], mapping.stats[:, 1]
+        total_pos, total_count = mapping.stats.sum(axis=0)
+        neg = counts - pos
+        pos_share, neg_share = pos / total_pos, neg / (total_count - total_pos)
+        woe = self._values_from_stats(pos, counts, total_pos, total_count)
+        return pd.DataFrame({
+            'count': counts, 'pos': pos, 'neg': neg, 'pos_share': pos_share, 'neg_share': neg_share, 'woe': woe,
+            'iv': (pos_share - neg_share) * woe,
+        }, index=mapping.index, columns=['count', 'pos', 'neg', 'pos_share', 'neg_share', 'woe', 'iv'])
+
+    def _values_from_stats(self, pos, counts, total_pos, total_count):
+        """WOE of categories with given counts of positive labels and samples, and given totals over all categories."""
+        neg = counts - pos
+        # For corner cases, defaulting to WOE = 0 (meaning no info)
+        undef = (counts < self.min_samples) | (pos == 0) | (neg == 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            woe = np.log((pos / total_pos) / (neg / (total_count - total_pos)))
+        return np.where(undef, 0., woe)
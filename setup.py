@@ -27,7 +27,8 @@ setup(
         'Topic :: Scientific/Engineering :: Mathematics',
     ],
     install_requires=[
+        'futures>=3.0.0; python_version<"3"',
         'numpy>=1.14.0',
-        'pandas>=0.22.0',
+        'pandas>=0.24.0',
     ],
 )
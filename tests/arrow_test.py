@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+from __future__ import division
+from __future__ import unicode_literals
+
+import shutil
+import tempfile
+import unittest
+
+import pandas as pd
+from genty import genty
+from genty import genty_dataset
+from nose.tools import eq_
+from nose.tools import ok_
+from numpy.testing import assert_array_almost_equal
+from numpy.testing import assert_array_equal
+
+from mlencoders import arrow
+from mlencoders.label_encoder import LabelEncoder
+from mlencoders.target_encoder import TargetEncoder
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+
+@unittest.skipIf(pa is None, 'pyarrow is not installed')
+@genty
+class ArrowTest(unittest.TestCase):
+
+    def setUp(self):
+        self.X = pd.DataFrame({
+            'str': ['a', 'b', None, 'a', 'c', 'b', 'a'],
+            'num': [1, 2, 1, None, 2, 2, 3],
+            'other': [0.5, 1.5, 2.5, 3.5, 4.5, 5.5, 6.5],
+        })
+        self.y = pd.Series([1, 0, 1, 1, 0, 1, 0])
+        self.table = pa.table({
+            'str': pa.array(self.X['str']).dictionary_encode(),
+            'num': pa.array([1, 2, 1, None, 2, 2, 3]),
+            'other': pa.array(self.X['other']),
+        })
+
+    def test_to_series(self):
+        series = arrow.to_series(pa.chunked_array([['a', None], ['b', 'a']]), 'cat')
+        eq_(series.dtype, 'category')
+        eq_(series.name, 'cat')
+        assert_array_equal(series.cat.codes, [0, -1, 1, 0])
+
+    @genty_dataset(
+        table=(False, None),
+        record_batch=(True, None),
+        out_of_fold=(False, 2),
+    )
+    def test_fit_transform(self, record_batch, cv):
+        table = self.table.to_batches()[0] if record_batch else self.table
+        enc = TargetEncoder(cols=['str', 'num'])
+        result = enc.fit_transform(table, pa.array(self.y), cv=cv)
+        eq_(type(result), type(table))
+        eq_(result.schema.names, ['str', 'num', 'other'])
+        expected = TargetEncoder(cols=['str', 'num']).fit_transform(self.X, self.y, cv=cv)
+        assert_array_almost_equal(result.to_pandas(), expected)
+        # Columns not encoded are shared
+        ok_(result.column(2).equals(table.column(2)))
+        assert_array_almost_equal(enc.transform(table).to_pandas(), enc.transform(self.X))
+
+    def test_label_as_category(self):
+        enc = LabelEncoder(cols=['str'], as_category=True)
+        enc.fit(self.table)
+        result = enc.transform(self.table)
+        ok_(pa.types.is_dictionary(result.schema.field('str').type))
+
+    def test_iter_parquet(self):
+        path = tempfile.mkdtemp()
+        try:
+            pq.write_table(self.table.append_column('y', pa.array(self.y)), path + '/data.parquet')
+            enc = TargetEncoder(cols=['str', 'num'])
+            enc.fit_from_iterator(arrow.iter_parquet(path, target='y', batch_size=3))
+            expected = TargetEncoder(cols=['str', 'num'])
+            expected.fit(self.X, self.y)
+            assert_array_almost_equal(enc.transform(self.X), expected.transform(self.X))
+        finally:
+            shutil.rmtree(path)
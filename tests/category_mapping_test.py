@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+from __future__ import division
+from __future__ import unicode_literals
+
+import pickle
+import unittest
+
+import numpy as np
+import pandas as pd
+from genty import genty
+from genty import genty_dataset
+from nose.tools import eq_
+from nose.tools import ok_
+from numpy.testing import assert_array_equal
+
+from mlencoders.category_mapping import CategoryMapping
+
+
+@genty
+class CategoryMappingTest(unittest.TestCase):
+
+    @genty_dataset(
+        strings=(['b', -99999, 'a'], ['a', np.nan, 'foo', None, 'b'], None, [2, 1, -1, 1, 0]),
+        categorical=(['b', -99999, 'a'], ['a', np.nan, 'foo', None, 'b'], 'category', [2, 1, -1, 1, 0]),
+        no_nan=(['b', 'a'], ['a', np.nan, 'b'], 'category', [1, -1, 0]),
+        dense_integers=([3, 0, 1], [1, 3, 2, -1, 5000], 'int64', [2, 0, -1, -1, -1]),
+        sparse_integers=([3, 10 ** 9, 1], [1, 3, 2, 10 ** 9], 'int64', [2, 0, -1, 1]),
+    )
+    def test_lookup(self, keys, values, dtype, expected):
+        mapping = CategoryMapping(np.array(keys, dtype=object if -99999 in keys else None), np.arange(len(keys)))
+        assert_array_equal(mapping.lookup(pd.Series(values, dtype=dtype)), expected)
+        eq_(mapping._table is not None, dtype == 'int64' and max(keys) < 1024)
+
+    def test_to_dict(self):
+        mapping = CategoryMapping(np.array(['b', 'a']), np.array([0.5, 0.25]))
+        eq_(mapping.to_dict(), {'b': 0.5, 'a': 0.25})
+        ok_(mapping.to_dict() is mapping.to_dict())
+
+    def test_to_frame(self):
+        mapping = CategoryMapping(np.array(['b', 'a']), None, np.array([[1., 2.], [0., 1.]]), ('sum', 'count'))
+        frame = mapping.to_frame()
+        assert_array_equal(frame.index, ['b', 'a'])
+        assert_array_equal(frame.columns, ['sum', 'count'])
+        frame = mapping.with_values(np.array([0.5, 0.])).to_frame()
+        assert_array_equal(frame.columns, ['sum', 'count', 'value'])
+        assert_array_equal(frame['value'], [0.5, 0.])
+
+    def test_pickle(self):
+        stats = np.array([[1., 2.], [0., 1.]])
+        mapping = CategoryMapping(np.array(['b', 'a']), np.array([0.5, 0.25]), stats, ('s', 'c'))
+        mapping.lookup(pd.Series(['a']))
+        loaded = pickle.loads(pickle.dumps(mapping, protocol=2))
+        ok_(loaded._index is None)
+        assert_array_equal(loaded.keys, mapping.keys)
+        assert_array_equal(loaded.values, mapping.values)
+        assert_array_equal(loaded.stats, mapping.stats)
+        eq_(loaded.stat_names, ('s', 'c'))
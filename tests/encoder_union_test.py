@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+from __future__ import division
+from __future__ import unicode_literals
+
+import unittest
+import warnings
+
+import numpy as np
+import pandas as pd
+from genty import genty
+from genty import genty_dataset
+from nose.tools import eq_
+from nose.tools import ok_
+from numpy.testing import assert_array_almost_equal
+from numpy.testing import assert_array_equal
+from numpy.testing import assert_raises
+from pandas.testing import assert_frame_equal
+
+from mlencoders.encoder_union import EncoderUnion
+from mlencoders.label_encoder import LabelEncoder
+from mlencoders.target_encoder import TargetEncoder
+from mlencoders.weight_of_evidence_encoder import WeightOfEvidenceEncoder
+
+
+@genty
+class EncoderUnionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.X = pd.DataFrame({
+            'cat': ['a', 'b', np.nan, 'a', 'c', 'b', 'a'],
+            'num': [1, 2, 1, 1, 2, 2, 3],
+            'other': [0.5, 1.5, 2.5, 3.5, 4.5, 5.5, 6.5],
+        })
+        self.y = pd.Series([1, 0, 1, 1, 0, 1, 0])
+
+    @genty_dataset(
+        object_columns=(None,),
+        categorical_columns=('category',),
+    )
+    def test_transform(self, dtype):
+        union = EncoderUnion([
+            ('label', LabelEncoder(cols=['cat'])),
+            ('target', TargetEncoder(cols=['cat', 'num'])),
+            ('woe', WeightOfEvidenceEncoder(cols=['cat'])),
+        ])
+        union.fit(self.X, self.y)
+        Z = pd.DataFrame({'cat': ['a', 'foo', np.nan, 'c'], 'num': [1, 2, 4, 3], 'other': [1., 2., 3., 4.]})
+        result = union.transform(Z.astype({'cat': dtype}) if dtype else Z)
+        eq_(list(result.columns), ['cat_label', 'cat_target', 'cat_woe', 'num', 'other'])
+        # Same as each encoder alone
+        for name, encoder in union.encoders:
+            assert_array_almost_equal(result['cat_' + name], encoder.transform(Z)['cat'])
+        assert_array_almost_equal(result['num'], union.encoders[1][1].transform(Z)['num'])
+        assert_array_equal(result['other'], Z['other'])
+        eq_(result['cat_label'].dtype, np.float64)
+
+    def test_output_types(self):
+        union = EncoderUnion([
+            ('label', LabelEncoder(cols=['cat'], as_category=True)),
+            ('target', TargetEncoder(cols=['num'], multiclass=True)),
+        ], dtype=np.float32)
+        result = union.fit_transform(self.X, self.y)
+        eq_(list(result.columns), ['cat', 'num_0', 'num_1', 'other'])
+        eq_(result['cat'].dtype, 'category')
+        eq_(result['num_0'].dtype, np.float32)
+        expected = union.encoders[1][1].transform(self.X)[['num_0', 'num_1']]
+        assert_array_almost_equal(result[['num_0', 'num_1']], expected)
+
+    @genty_dataset(
+        copy=(True,),
+        no_copy=(False,),
+    )
+    def test_transform_copy(self, copy):
+        union = EncoderUnion([('target', TargetEncoder(cols=['cat', 'num']))])
+        union.fit(self.X, self.y)
+        X = self.X.copy()
+        with warnings.catch_warnings():
+            # Columns are not inserted one by one, which fragments the frame
+            warnings.simplefilter('error', pd.errors.PerformanceWarning)
+            result = union.transform(X, copy=copy)
+        # X is unchanged, untouched columns are shared with it
+        assert_frame_equal(X, self.X)
+        ok_(np.shares_memory(result['other'].values, X['other'].values))
+        assert_array_almost_equal(result[['cat', 'num']], union.encoders[0][1].transform(X)[['cat', 'num']])
+
+    def test_unseen_error(self):
+        union = EncoderUnion([('target', TargetEncoder(cols=['cat'], handle_unseen='error'))])
+        union.fit(self.X, self.y)
+        assert_raises(ValueError, union.transform, pd.DataFrame({'cat': ['foo']}))
+
+    def test_init_wrong_dtype(self):
+        assert_raises(ValueError, EncoderUnion, [('target', TargetEncoder(cols=['cat']))], dtype=np.int64)
@@ -2,6 +2,8 @@
 from __future__ import division
 from __future__ import unicode_literals
 
+import shutil
+import tempfile
 import unittest
 
 import numpy as np
@@ -13,6 +15,7 @@ from nose.tools import ok_
 from numpy.testing import assert_array_equal
 from numpy.testing import assert_raises
 
+from mlencoders.category_mapping import CategoryMapping
 from mlencoders.label_encoder import LabelEncoder
 
 
@@ -51,9 +54,9 @@ class LabelEncoderTest(unittest.TestCase):
         assert_array_equal(result, pd.DataFrame(expected))
         eq_(enc._imputed, -99999)
         ok_('cat' in enc._mapping)
-        ok_(isinstance(enc._mapping['cat'], pd.DataFrame))
+        ok_(isinstance(enc._mapping['cat'], CategoryMapping))
         assert_array_equal(enc._mapping['cat'].index, columns)
-        assert_array_equal(enc._mapping['cat'].columns, ['value'])
+        assert_array_equal(enc._mapping['cat'].to_frame().columns, ['count', 'value'])
 
     @genty_dataset(
         some_input=(['a', 'a', np.nan, 'b'], [0, 0, 1, 2], ['a', -99999, 'b']),
@@ -63,10 +66,10 @@ class LabelEncoderTest(unittest.TestCase):
         result = enc.fit_transform(pd.DataFrame(X, columns=['cat']))
         assert_array_equal(result, pd.DataFrame(expected))
         ok_('cat' in enc._mapping)
-        ok_(isinstance(enc._mapping['cat'], pd.DataFrame))
+        ok_(isinstance(enc._mapping['cat'], CategoryMapping))
         eq_(enc._mapping['cat'].index[1], -99999)
         assert_array_equal(enc._mapping['cat'].index, pd.Series(columns))
-        assert_array_equal(enc._mapping['cat'].columns, ['value'])
+        assert_array_equal(enc._mapping['cat'].to_frame().columns, ['count', 'value'])
 
     @genty_dataset(
         ignore=(['a', 'a', 'b', 'b'], ['foo', 'a', 'b'], 'ignore', [np.nan, 0, 1]),
@@ -98,12 +101,12 @@ class LabelEncoderTest(unittest.TestCase):
         assert_array_equal(result, pd.DataFrame(expected))
         ok_('cat1' in enc._mapping)
         ok_('cat2' in enc._mapping)
-        ok_(isinstance(enc._mapping['cat1'], pd.DataFrame))
-        ok_(isinstance(enc._mapping['cat2'], pd.DataFrame))
+        ok_(isinstance(enc._mapping['cat1'], CategoryMapping))
+        ok_(isinstance(enc._mapping['cat2'], CategoryMapping))
         assert_array_equal(enc._mapping['cat1'].index, ['a', 'b'])
         assert_array_equal(enc._mapping['cat2'].index, ['foo', 'bar'])
-        assert_array_equal(enc._mapping['cat1'].columns, ['value'])
-        assert_array_equal(enc._mapping['cat2'].columns, ['value'])
+        assert_array_equal(enc._mapping['cat1'].to_frame().columns, ['count', 'value'])
+        assert_array_equal(enc._mapping['cat2'].to_frame().columns, ['count', 'value'])
 
     @genty_dataset(
         some_input=([['a', 'foo'], ['a', 'bar'], ['b', 'foo']], [[0, 0], [0, 1], [1, 0]]),
@@ -116,9 +119,173 @@ class LabelEncoderTest(unittest.TestCase):
         assert_array_equal(enc.cols, ['cat1', 'cat2'])
         ok_('cat1' in enc._mapping)
         ok_('cat2' in enc._mapping)
-        ok_(isinstance(enc._mapping['cat1'], pd.DataFrame))
-        ok_(isinstance(enc._mapping['cat2'], pd.DataFrame))
+        ok_(isinstance(enc._mapping['cat1'], CategoryMapping))
+        ok_(isinstance(enc._mapping['cat2'], CategoryMapping))
         assert_array_equal(enc._mapping['cat1'].index, ['a', 'b'])
         assert_array_equal(enc._mapping['cat2'].index, ['foo', 'bar'])
-        assert_array_equal(enc._mapping['cat1'].columns, ['value'])
-        assert_array_equal(enc._mapping['cat2'].columns, ['value'])
+        assert_array_equal(enc._mapping['cat1'].to_frame().columns, ['count', 'value'])
+        assert_array_equal(enc._mapping['cat2'].to_frame().columns, ['count', 'value'])
+
+    @genty_dataset(
+        threads_2=(2,),
+        all_processors=(-1,),
+    )
+    def test_n_jobs(self, n_jobs):
+        X = pd.DataFrame({'cat{}'.format(i): list('abcab'[i:] + 'abcab'[:i]) for i in range(5)})
+        serial = LabelEncoder().fit_transform(X)
+        enc = LabelEncoder(n_jobs=n_jobs)
+        result = enc.fit_transform(X)
+        assert_array_equal(result.columns, serial.columns)
+        assert_array_equal(result, serial)
+
+    @genty_dataset(
+        two_chunks=(2,),
+        unbalanced_chunks=(5,),
+    )
+    def test_partial_fit(self, chunk_size):
+        X = pd.DataFrame({'cat1': ['a', 'b', np.nan, 'a', 'c', 'b', 'a'], 'cat2': [1, 2, 1, 1, 2, 2, 3]})
+        expected = LabelEncoder().fit_transform(X)
+        enc = LabelEncoder()
+        for i in range(0, X.shape[0], chunk_size):
+            enc.partial_fit(X.iloc[i:i + chunk_size])
+        assert_array_equal(enc.transform(X), expected)
+        # Same result from an iterator of chunks
+        enc = LabelEncoder()
+        enc.fit_from_iterator(X.iloc[i:i + chunk_size] for i in range(0, 7, chunk_size))
+        assert_array_equal(enc.transform(X), expected)
+        assert_array_equal(enc._mapping['cat1'].index, pd.Series(['a', 'b', -99999, 'c']))
+
+    def test_merge(self):
+        X = pd.DataFrame({'cat1': ['a', 'b', np.nan, 'a', 'c', 'b', 'a'], 'cat2': [1, 2, 1, 1, 2, 2, 3]})
+        expected = LabelEncoder().fit_transform(X)
+        shards = [LabelEncoder() for _ in range(3)]
+        for i, enc in enumerate(shards):
+            enc.fit(X.iloc[3 * i:3 * i + 3])
+        assert_array_equal(LabelEncoder.merge(shards).transform(X), expected)
+        assert_array_equal((shards[0] + shards[1] + shards[2]).transform(X), expected)
+        assert_raises(ValueError, LabelEncoder.merge, [shards[0], LabelEncoder()])
+
+    @genty_dataset(
+        memory_mapped=('r',),
+        in_memory=(None,),
+    )
+    def test_save_load_npy_files(self, mmap_mode):
+        X = pd.DataFrame({'cat1': ['a', 'b', np.nan, 'a', 'c', 'b', 'a'], 'cat2': [1, 2, 1, 1, 2, 2, 3]})
+        enc = LabelEncoder(cols=['cat1', 'cat2'])
+        expected = enc.fit_transform(X)
+        path = tempfile.mkdtemp()
+        try:
+            enc.save_as_npy_files(path)
+            loaded = LabelEncoder()
+            loaded.load_from_npy_files(path, mmap_mode=mmap_mode)
+            eq_(loaded.cols, ['cat1', 'cat2'])
+            eq_(loaded._imputed, enc._imputed)
+            for col in ['cat1', 'cat2']:
+                assert_array_equal(loaded._mapping[col].index, enc._mapping[col].index)
+                assert_array_equal(loaded._mapping[col].to_frame(), enc._mapping[col].to_frame())
+            assert_array_equal(loaded.transform(X), expected)
+        finally:
+            shutil.rmtree(path)
+
+    def test_transform_record(self):
+        enc = LabelEncoder(cols=['cat'])
+        enc.fit(pd.DataFrame({'cat': ['a', np.nan, 'b']}))
+        eq_(enc.transform_record({'cat': 'b', 'num': 1}), {'cat': 2, 'num': 1})
+        eq_(enc.transform_record({'cat': None}), {'cat': 1})
+        ok_(np.isnan(enc.transform_record({'cat': 'foo'})['cat']))
+        assert_array_equal(enc.transform_records([{'cat': 'b'}, {'cat': np.nan}, {'cat': 'a'}]), [[2], [1], [0]])
+
+    def test_fit_transform_out_of_fold(self):
+        assert_raises(ValueError, LabelEncoder().fit_transform, pd.DataFrame({'cat': ['a', 'b']}), None, 2)
+
+    @genty_dataset(
+        categorical=('category',),
+        default=(None,),
+    )
+    def test_as_category(self, dtype):
+        X = pd.DataFrame({'cat': pd.Series(['b', 'a', np.nan, 'b'], dtype=dtype)})
+        enc = LabelEncoder(as_category=True)
+        result = enc.fit_transform(X)
+        eq_(result['cat'].dtype.name, 'category')
+        assert_array_equal(result['cat'].cat.codes, [0, 1, 2, 0])
+        assert_array_equal(result['cat'].cat.categories, pd.Series(['b', 'a', -99999]))
+        result = enc.transform(pd.DataFrame({'cat': pd.Series(['a', 'foo'], dtype=dtype)}))
+        assert_array_equal(result['cat'].cat.codes, [1, -1])
+
+    @genty_dataset(
+        int8=(None, 128, np.int8),
+        int16=(None, 129, np.int16),
+        int32=(None, 40000, np.int32),
+        explicit=(np.int64, 3, np.int64),
+    )
+    def test_dtype(self, dtype, n_categories, expected):
+        enc = LabelEncoder(dtype=dtype)
+        X = pd.DataFrame({'cat': np.arange(n_categories)})
+        result = enc.fit_transform(X)
+        eq_(result['cat'].dtype, expected)
+        assert_array_equal(result['cat'], np.arange(n_categories))
+        # Unseen categories are missing values, which integers cannot hold
+        result = enc.transform(pd.DataFrame({'cat': [0, -1]}))
+        eq_(result['cat'].dtype, np.float64)
+        assert_array_equal(result['cat'], [0, np.nan])
+
+    @genty_dataset(
+        int8=(np.int8, 129),
+        uint8=(np.uint8, 257),
+    )
+    def test_dtype_too_small(self, dtype, n_categories):
+        enc = LabelEncoder(dtype=dtype)
+        enc.fit(pd.DataFrame({'cat': np.arange(n_categories - 1)}))
+        assert_raises(ValueError, enc.fit, pd.DataFrame({'cat': np.arange(n_categories)}))
+
+    def test_dtype_not_numeric(self):
+        assert_raises(ValueError, LabelEncoder, dtype=object)
+
+    @genty_dataset(
+        max_categories=({'max_categories': 2}, [0, 0, 0, 1, 1, 2, 2, 2], 3),
+        min_frequency=({'min_frequency': 3}, [0, 0, 0, 1, 1, 1, 1, 1], 2),
+    )
+    def test_collapse_rare_categories(self, kwargs, expected, n_categories):
+        enc = LabelEncoder(**kwargs)
+        X = pd.DataFrame({'cat': ['a', 'a', 'a', 'b', 'b', 'c', 'd', np.nan]})
+        assert_array_equal(enc.fit_transform(X)['cat'], expected)
+        eq_(len(enc._mapping['cat']), n_categories)
+        eq_(enc._mapping['cat'].keys[-1], -99998)
+        # Rare categories get the other label, unseen ones are ignored
+        result = enc.transform(pd.DataFrame({'cat': ['a', 'c', 'foo']}))
+        assert_array_equal(result['cat'], [0, n_categories - 1, np.nan])
+        eq_(enc.transform_record({'cat': 'c'})['cat'], n_categories - 1)
+        ok_(np.isnan(enc.transform_record({'cat': 'foo'})['cat']))
+        enc = LabelEncoder(handle_unseen='error', **kwargs)
+        enc.fit(X)
+        assert_raises(ValueError, enc.transform, pd.DataFrame({'cat': ['c', 'foo']}))
+
+    def test_collapse_rare_categories_chunked(self):
+        # Categories rare in each chunk but frequent overall keep their own label
+        X1, X2 = pd.DataFrame({'cat': ['x', 'y', 'y', 'y', 'z']}), pd.DataFrame({'cat': ['x', 'x', 'x', 'y']})
+        expected = LabelEncoder(min_frequency=2)
+        expected.fit(pd.concat([X1, X2]))
+        eq_(expected._mapping['cat'].to_dict(), {'x': 0, 'y': 1, -99998: 2, 'z': 2})
+        shards = [LabelEncoder(min_frequency=2), LabelEncoder(min_frequency=2)]
+        shards[0].fit(X1)
+        shards[1].fit(X2)
+        chunked = LabelEncoder(min_frequency=2)
+        chunked.fit_from_iterator([X1, X2])
+        for enc in [LabelEncoder.merge(shards), chunked]:
+            eq_(enc._mapping['cat'].to_dict(), expected._mapping['cat'].to_dict())
+
+    def test_hashed_encoding(self):
+        enc = LabelEncoder(n_buckets=1024)
+        X = pd.DataFrame({'cat': ['a', 'b', np.nan, 'a', None]})
+        result = enc.fit_transform(X)['cat']
+        eq_(result.dtype, np.int16)
+        ok_(((result >= 0) & (result < 1024)).all())
+        eq_(result[0], result[3])
+        eq_(result[2], result[4])
+        eq_(len(set(result)), 3)
+        assert_array_equal(enc.transform(pd.DataFrame({'cat': ['b', 'foo']}))['cat'], [result[1], np.nan])
+        eq_(enc.transform_record({'cat': 'a'})['cat'], result[0])
+        eq_(enc.collision_stats().loc['cat', 'occupied'], 3)
+        exact = LabelEncoder()
+        exact.fit(X)
+        assert_raises(ValueError, exact.collision_stats)
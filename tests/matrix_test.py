@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+from __future__ import division
+from __future__ import unicode_literals
+
+import unittest
+
+import numpy as np
+import pandas as pd
+from genty import genty
+from genty import genty_dataset
+from nose.tools import eq_
+from nose.tools import ok_
+from numpy.testing import assert_array_almost_equal
+from numpy.testing import assert_array_equal
+
+from mlencoders import matrix
+from mlencoders.label_encoder import LabelEncoder
+from mlencoders.target_encoder import TargetEncoder
+
+try:
+    import scipy.sparse as sp
+except ImportError:
+    sp = None
+
+
+@genty
+class MatrixTest(unittest.TestCase):
+
+    def setUp(self):
+        self.X = np.array([[1, 10, 5], [2, 20, 5], [1, 10, 6], [0, 30, 5], [2, 20, 0], [0, 10, 6]])
+        self.y = np.array([1, 0, 1, 1, 0, 0])
+        # Expected results, from DataFrames
+        self.frame = pd.DataFrame(self.X)
+
+    def test_is_matrix(self):
+        ok_(matrix.is_matrix(self.X))
+        ok_(not matrix.is_matrix(self.X[:, 0]))
+        ok_(not matrix.is_matrix(self.frame))
+
+    @genty_dataset(
+        transform=(None,),
+        out_of_fold=(2,),
+    )
+    def test_fit_transform_ndarray(self, cv):
+        enc = TargetEncoder(cols=[0, 2])
+        result = enc.fit_transform(self.X, self.y, cv=cv)
+        expected = TargetEncoder(cols=[0, 2]).fit_transform(self.frame, pd.Series(self.y), cv=cv)
+        eq_(type(result), np.ndarray)
+        assert_array_almost_equal(result, expected)
+        assert_array_almost_equal(enc.transform(self.X), TargetEncoder(cols=[0, 2]).fit_transform(self.frame, self.y))
+        assert_array_almost_equal(enc.transform(self.X, cols=[2])[:, :2], self.X[:, :2])
+
+    def test_transform_in_place(self):
+        X = self.X.astype(float)
+        enc = TargetEncoder(cols=[1])
+        enc.fit(X, self.y)
+        result = enc.transform(X, copy=False)
+        ok_(result is X)
+        assert_array_almost_equal(result[:, 1], enc.transform(self.frame)[1])
+
+    def test_multiple_targets(self):
+        y = np.column_stack([self.y, 1 - self.y])
+        enc = TargetEncoder(cols=[0])
+        result = enc.fit_transform(self.X, y)
+        eq_(result.shape, (6, 4))
+        assert_array_almost_equal(result[:, 0] + result[:, 1], 1)
+        assert_array_equal(result[:, 2:], self.X[:, 1:])
+
+    @unittest.skipIf(sp is None, 'scipy is not installed')
+    @genty_dataset(
+        csr=('csr',),
+        csc=('csc',),
+    )
+    def test_fit_transform_sparse(self, sparse_format):
+        X = sp.csr_matrix(self.X).asformat(sparse_format)
+        enc = TargetEncoder(cols=[0, 2])
+        result = enc.fit_transform(X, self.y)
+        eq_(result.format, sparse_format)
+        # Implicit zeros are a category like any other
+        assert_array_almost_equal(result.toarray(), TargetEncoder(cols=[0, 2]).fit_transform(self.frame, self.y))
+
+    @unittest.skipIf(sp is None, 'scipy is not installed')
+    @genty_dataset(
+        labels=(False,),
+        as_category=(True,),
+    )
+    def test_transform_one_hot(self, as_category):
+        enc = LabelEncoder(cols=[0, 2], as_category=as_category)
+        enc.fit(self.X)
+        X = np.array([[1, 0, 6], [7, 0, 5], [0, 0, 0]])
+        result = enc.transform_one_hot(X)
+        eq_(result.format, 'csr')
+        # Labels of column 0: 1, 2, 0, then of column 2: 5, 6, 0. Unseen category 7 has no entry.
+        expected = [[1, 0, 0, 0, 1, 0], [0, 0, 0, 1, 0, 0], [0, 0, 1, 0, 0, 1]]
+        assert_array_equal(result.toarray(), expected)
+        ok_(result.has_sorted_indices)
+        frame = pd.DataFrame(X)
+        assert_array_equal(enc.transform_one_hot(frame, cols=[2]).toarray(), np.array(expected)[:, 3:])
+
+    @unittest.skipIf(sp is None, 'scipy is not installed')
+    def test_one_hot(self):
+        result = matrix.one_hot([np.array([1, 0, 1], dtype=np.int8), np.array([2., np.nan, 0.])], [2, 3], np.int8)
+        eq_(result.dtype, np.int8)
+        assert_array_equal(result.toarray(), [[0, 1, 0, 0, 1], [1, 0, 0, 0, 0], [0, 1, 1, 0, 0]])
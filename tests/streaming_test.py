@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+from __future__ import division
+from __future__ import unicode_literals
+
+import gc
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import warnings
+
+import pandas as pd
+from genty import genty
+from genty import genty_dataset
+from nose.tools import eq_
+from nose.tools import ok_
+from numpy.testing import assert_array_almost_equal
+from numpy.testing import assert_array_equal
+from numpy.testing import assert_raises
+
+from mlencoders import streaming
+from mlencoders.label_encoder import LabelEncoder
+from mlencoders.target_encoder import TargetEncoder
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+
+@genty
+class StreamingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.X = pd.DataFrame({
+            'cat': ['a', 'b', 'c', 'a', 'c', 'b', 'a', 'd'],
+            'num': [1, 2, 1, 3, 2, 2, 3, 1],
+            'other': [0.5, 1.5, 2.5, 3.5, 4.5, 5.5, 6.5, 7.5],
+        })
+        self.y = pd.Series([1, 0, 1, 1, 0, 1, 0, 1])
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    @genty_dataset(
+        csv=('data.csv', 'csv'),
+        compressed_csv=('data.CSV.gz', 'csv'),
+        parquet=('data.parquet', 'parquet'),
+    )
+    def test_infer_format(self, name, expected):
+        eq_(streaming.infer_format(os.path.join(self.path, name)), expected)
+
+    def test_infer_format_unknown(self):
+        assert_raises(ValueError, streaming.infer_format, 'data.txt')
+
+    @genty_dataset(
+        in_calling_thread=(0,),
+        background=(1,),
+        background_buffered=(3,),
+    )
+    def test_prefetch(self, size):
+        eq_(list(streaming.prefetch(iter(range(10)), size)), list(range(10)))
+
+    def test_prefetch_error(self):
+        def items():
+            yield 1
+            raise KeyError('foo')
+
+        result = []
+        with assert_raises(KeyError):
+            for item in streaming.prefetch(items()):
+                result.append(item)
+        eq_(result, [1])
+
+    def test_prefetch_stopped(self):
+        # The producer thread ends when items are not used anymore
+        items = streaming.prefetch(iter(range(100)))
+        eq_(next(items), 0)
+        items.close()
+        eq_(threading.active_count(), 1)
+
+    @genty_dataset(
+        sequential=(0,),
+        concurrent=(1,),
+    )
+    def test_transform_iter(self, prefetch):
+        enc = TargetEncoder(cols=['cat', 'num'])
+        enc.fit(self.X, self.y)
+        chunks = (self.X[i:i + 3] for i in range(0, len(self.X), 3))
+        result = pd.concat(enc.transform_iter(chunks, prefetch=prefetch))
+        assert_array_almost_equal(result, enc.transform(self.X))
+
+    def test_transform_iter_before_fit(self):
+        assert_raises(ValueError, TargetEncoder().transform_iter, [self.X])
+
+    @genty_dataset(
+        sequential=(0,),
+        concurrent=(1,),
+    )
+    def test_transform_file_csv(self, prefetch):
+        enc = TargetEncoder(cols=['cat', 'num'])
+        enc.fit(self.X, self.y)
+        input_path, output_path = os.path.join(self.path, 'in.csv'), os.path.join(self.path, 'out.csv')
+        self.X.to_csv(input_path, index=False)
+        eq_(enc.transform_file(input_path, output_path, chunksize=3, prefetch=prefetch), 8)
+        result = pd.read_csv(output_path)
+        eq_(list(result.columns), ['cat', 'num', 'other'])
+        assert_array_almost_equal(result, enc.transform(self.X))
+
+    @unittest.skipIf(pa is None, 'pyarrow is not installed')
+    def test_transform_file_parquet(self):
+        enc = LabelEncoder(cols=['cat'], as_category=True)
+        enc.fit(self.X[:7])
+        input_path, output_path = os.path.join(self.path, 'in.parquet'), os.path.join(self.path, 'out.parquet')
+        pq.write_table(pa.Table.from_pandas(self.X, preserve_index=False), input_path)
+        # The last chunk has an unseen category
+        eq_(enc.transform_file(input_path, output_path, chunksize=4), 8)
+        result = pq.read_table(output_path).to_pandas()
+        eq_(list(result.columns), ['cat', 'num', 'other'])
+        assert_array_equal(result['cat'].astype(object).fillna('unseen'), ['a', 'b', 'c', 'a', 'c', 'b', 'a', 'unseen'])
+        assert_array_equal(result['other'], self.X['other'])
+
+    @unittest.skipIf(pa is None, 'pyarrow is not installed')
+    @genty_dataset(
+        unseen_in_last_chunk=(slice(None),),
+        unseen_in_first_chunk=(slice(None, None, -1),),
+    )
+    def test_transform_file_parquet_labels(self, order):
+        # Integer labels, missing for unseen categories, have the same type in all chunks
+        enc = LabelEncoder(cols=['cat'])
+        enc.fit(self.X[:7])
+        X = self.X[order]
+        input_path, output_path = os.path.join(self.path, 'in.parquet'), os.path.join(self.path, 'out.parquet')
+        pq.write_table(pa.Table.from_pandas(X, preserve_index=False), input_path)
+        eq_(enc.transform_file(input_path, output_path, chunksize=4), 8)
+        result = pq.read_table(output_path)
+        eq_(result.schema.field('cat').type, pa.int8())
+        expected = enc.transform(X)['cat']
+        assert_array_equal(result.column('cat').to_pandas(), expected)
+
+    def test_transform_file_csv_labels(self):
+        enc = LabelEncoder(cols=['cat'])
+        enc.fit(self.X[:7])
+        input_path, output_path = os.path.join(self.path, 'in.csv'), os.path.join(self.path, 'out.csv')
+        self.X.to_csv(input_path, index=False)
+        eq_(enc.transform_file(input_path, output_path, chunksize=4), 8)
+        with open(output_path) as f:
+            eq_([line.split(',')[0] for line in f.read().splitlines()], ['cat', '0', '1', '2', '0', '2', '1', '0', ''])
+
+    @genty_dataset(
+        encoding_error=('unseen', 'out.csv'),
+        writing_error=('d', os.path.join('missing', 'out.csv')),
+    )
+    def test_transform_file_error(self, unseen, output_name):
+        # Background threads are stopped after an error
+        enc = TargetEncoder(cols=['cat'], handle_unseen='error')
+        enc.fit(self.X, self.y)
+        input_path, output_path = os.path.join(self.path, 'in.csv'), os.path.join(self.path, output_name)
+        self.X.assign(cat=unseen).to_csv(input_path, index=False)
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            try:
+                enc.transform_file(input_path, output_path, chunksize=1)
+            except (ValueError, IOError) as e:
+                # Even while the error, and the frames referenced by its traceback, are alive
+                eq_(threading.active_count(), 1)
+                ok_(isinstance(e, ValueError if unseen == 'unseen' else IOError))
+            else:
+                raise AssertionError('transform_file should fail')
+            gc.collect()
+        # The input file is closed, not left to the garbage collector
+        eq_([str(w.message) for w in caught if 'unclosed file' in str(w.message)], [])
@@ -2,7 +2,13 @@
 from __future__ import division
 from __future__ import unicode_literals
 
+import copy
+import os
+import pickle
+import shutil
+import tempfile
 import unittest
+import warnings
 
 import numpy as np
 import pandas as pd
@@ -14,6 +20,7 @@ from numpy.testing import assert_array_almost_equal
 from numpy.testing import assert_array_equal
 from numpy.testing import assert_raises
 
+from mlencoders.category_mapping import CategoryMapping
 from mlencoders.target_encoder import TargetEncoder
 
 
@@ -40,6 +47,14 @@ class TargetEncoderTest(unittest.TestCase):
     def test_init_wrong_input(self, handle_unseen):
         assert_raises(ValueError, TargetEncoder, None, handle_unseen)
 
+    @genty_dataset(
+        int32=(np.int32,),
+        int64=(np.int64,),
+        not_numeric=(object,),
+    )
+    def test_init_wrong_dtype(self, dtype):
+        assert_raises(ValueError, TargetEncoder, dtype=dtype)
+
     def test_transform_before_fit(self):
         enc = TargetEncoder()
         assert_raises(ValueError, enc.transform, 1)
@@ -56,9 +71,9 @@ class TargetEncoderTest(unittest.TestCase):
         assert_array_almost_equal(result, pd.DataFrame(expected), decimal=3)
         eq_(enc._imputed, imputed)
         ok_('cat' in enc._mapping)
-        ok_(isinstance(enc._mapping['cat'], pd.DataFrame))
+        ok_(isinstance(enc._mapping['cat'], CategoryMapping))
         assert_array_equal(enc._mapping['cat'].index, columns)
-        assert_array_equal(enc._mapping['cat'].columns, ['mean', 'count', 'value'])
+        assert_array_equal(enc._mapping['cat'].to_frame().columns, ['sum', 'count', 'value'])
 
     @genty_dataset(
         some_input=(['a', 'a', np.nan, 'b'], [1, 1, 0, 1], [0.933, 0.933, 0.750, 0.750], ['a', 'b']),
@@ -68,10 +83,33 @@ class TargetEncoderTest(unittest.TestCase):
         result = enc.fit_transform(pd.DataFrame(X, columns=['cat']), pd.Series(y))
         assert_array_almost_equal(result, pd.DataFrame(expected), decimal=3)
         ok_('cat' in enc._mapping)
-        ok_(isinstance(enc._mapping['cat'], pd.DataFrame))
+        ok_(isinstance(enc._mapping['cat'], CategoryMapping))
         eq_(enc._mapping['cat'].index[0], -99999)
         assert_array_equal(enc._mapping['cat'].index[1:], columns)
-        assert_array_equal(enc._mapping['cat'].columns, ['mean', 'count', 'value'])
+        assert_array_equal(enc._mapping['cat'].to_frame().columns, ['sum', 'count', 'value'])
+
+    @genty_dataset(
+        single_target=({}, [1, 0, np.nan, 1, 0, 1, np.nan, 1], None),
+        out_of_fold=({}, [1, 0, np.nan, 1, 0, 1, np.nan, 1], 2),
+        multiclass=({'multiclass': True}, ['x', 'y', None, 'x', 'y', 'y', None, 'x'], None),
+    )
+    def test_encode_missing_targets(self, kwargs, y, cv):
+        # Samples with a missing target are left out of statistics, as if they were not in the training data
+        X = pd.DataFrame({'cat': ['a', 'a', 'a', 'b', 'b', 'b', 'c', 'c']})
+        y = pd.Series(y)
+        observed = y.notna().values
+        enc = TargetEncoder(**kwargs)
+        result = enc.fit_transform(X, y, cv=cv)
+        ok_(not result.isna().any().any())
+        expected = TargetEncoder(**kwargs)
+        expected.fit(X[observed], y[observed])
+        assert_array_almost_equal(enc._imputed, expected._imputed)
+        if cv is None:
+            assert_array_almost_equal(result, expected.transform(X))
+        # Updates too
+        enc.update(X, y)
+        expected.update(X[observed], y[observed])
+        assert_array_almost_equal(enc.transform(X), expected.transform(X))
 
     @genty_dataset(
         impute=(['a', 'a', 'b', 'b'], [1, 1, 0, 1], ['foo', 'a', 'b'], 'impute', [0.750, 0.933, 0.567]),
@@ -105,12 +143,12 @@ class TargetEncoderTest(unittest.TestCase):
         assert_array_almost_equal(result, pd.DataFrame(expected), decimal=2)
         ok_('cat1' in enc._mapping)
         ok_('cat2' in enc._mapping)
-        ok_(isinstance(enc._mapping['cat1'], pd.DataFrame))
-        ok_(isinstance(enc._mapping['cat2'], pd.DataFrame))
+        ok_(isinstance(enc._mapping['cat1'], CategoryMapping))
+        ok_(isinstance(enc._mapping['cat2'], CategoryMapping))
         assert_array_equal(enc._mapping['cat1'].index, ['a', 'b'])
         assert_array_equal(enc._mapping['cat2'].index, ['bar', 'foo'])
-        assert_array_equal(enc._mapping['cat1'].columns, ['mean', 'count', 'value'])
-        assert_array_equal(enc._mapping['cat2'].columns, ['mean', 'count', 'value'])
+        assert_array_equal(enc._mapping['cat1'].to_frame().columns, ['sum', 'count', 'value'])
+        assert_array_equal(enc._mapping['cat2'].to_frame().columns, ['sum', 'count', 'value'])
 
     @genty_dataset(
         some_input=([['a', 'foo'], ['a', 'bar'], ['b', 'foo']], [1, 0, 1], [[0.54, 0.91], [0.54, 0.67], [0.67, 0.91]]),
@@ -123,9 +161,554 @@ class TargetEncoderTest(unittest.TestCase):
         assert_array_equal(enc.cols, ['cat1', 'cat2'])
         ok_('cat1' in enc._mapping)
         ok_('cat2' in enc._mapping)
-        ok_(isinstance(enc._mapping['cat1'], pd.DataFrame))
-        ok_(isinstance(enc._mapping['cat2'], pd.DataFrame))
+        ok_(isinstance(enc._mapping['cat1'], CategoryMapping))
+        ok_(isinstance(enc._mapping['cat2'], CategoryMapping))
         assert_array_equal(enc._mapping['cat1'].index, ['a', 'b'])
         assert_array_equal(enc._mapping['cat2'].index, ['bar', 'foo'])
-        assert_array_equal(enc._mapping['cat1'].columns, ['mean', 'count', 'value'])
-        assert_array_equal(enc._mapping['cat2'].columns, ['mean', 'count', 'value'])
+        assert_array_equal(enc._mapping['cat1'].to_frame().columns, ['sum', 'count', 'value'])
+        assert_array_equal(enc._mapping['cat2'].to_frame().columns, ['sum', 'count', 'value'])
+
+    @genty_dataset(
+        copy=(True,),
+        inplace=(False,),
+    )
+    def test_transform_copy(self, copy):
+        enc = TargetEncoder(cols=['cat'])
+        X = pd.DataFrame({'cat': ['a', 'a', 'b', 'b'], 'num': [1, 2, 3, 4]})
+        enc.fit(X, pd.Series([1, 1, 0, 1]))
+        result = enc.transform(X, copy=copy)
+        assert_array_almost_equal(result['cat'], [0.933, 0.933, 0.567, 0.567], decimal=3)
+        assert_array_equal(result['num'], [1, 2, 3, 4])
+        # DataFrames are never modified, untouched columns are shared
+        ok_(result is not X)
+        eq_(X['cat'].dtype, object)
+        ok_(np.shares_memory(result['num'].values, X['num'].values))
+
+    def test_transform_copy_slice(self):
+        # No SettingWithCopyWarning for a frame sliced from another
+        enc = TargetEncoder(cols=['cat'])
+        X = pd.DataFrame({'cat': ['a', 'a', 'b', 'b'], 'num': [1, 2, 3, 4]})
+        enc.fit(X, pd.Series([1, 1, 0, 1]))
+        sliced = X[X.num > 1]
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            result = enc.transform(sliced, copy=False)
+        assert_array_almost_equal(result['cat'], [0.933, 0.567, 0.567], decimal=3)
+
+    @genty_dataset(
+        copy=(True,),
+        inplace=(False,),
+    )
+    def test_transform_wide_frame(self, copy):
+        # Columns of a single dtype share a block: untouched ones are not copied, whatever the number of encoded ones
+        X = pd.DataFrame(np.arange(60).reshape(6, 10) % 4, columns=['c{}'.format(i) for i in range(10)])
+        X.columns.name = 'features'
+        initial = X.copy()
+        untouched = {col: X[col].values for col in ['c1', 'c3', 'c9']}
+        enc = TargetEncoder(cols=['c0', 'c2', 'c4'])
+        enc.fit(X, pd.Series([1, 0, 1, 1, 0, 1]))
+        expected = {col: enc.transform(X[[col]], cols=[col])[col] for col in enc.cols}
+        result = enc.transform(X, copy=copy)
+        eq_(list(result.columns), list(initial.columns))
+        eq_(result.columns.name, 'features')
+        for col in initial.columns:
+            assert_array_equal(result[col], expected[col] if col in enc.cols else initial[col])
+        ok_(all(np.shares_memory(result[col].values, values) for col, values in untouched.items()))
+        assert_array_equal(X, initial)
+
+    @genty_dataset(
+        threads_2=(2,),
+        all_processors=(-1,),
+    )
+    def test_n_jobs(self, n_jobs):
+        X = pd.DataFrame({'cat{}'.format(i): list('abcab'[i:] + 'abcab'[:i]) for i in range(5)})
+        y = pd.Series([1, 0, 1, 1, 0])
+        serial = TargetEncoder().fit_transform(X, y)
+        enc = TargetEncoder(n_jobs=n_jobs)
+        result = enc.fit_transform(X, y)
+        assert_array_equal(result.columns, serial.columns)
+        assert_array_equal(result, serial)
+
+    @genty_dataset(
+        two_chunks=(2,),
+        unbalanced_chunks=(5,),
+    )
+    def test_partial_fit(self, chunk_size):
+        X = pd.DataFrame({'cat1': ['a', 'b', np.nan, 'a', 'c', 'b', 'a'], 'cat2': [1, 2, 1, 1, 2, 2, 3]})
+        y = pd.Series([1, 0, 1, 1, 0, 1, 0])
+        expected = TargetEncoder().fit_transform(X, y)
+        enc = TargetEncoder()
+        for i in range(0, X.shape[0], chunk_size):
+            enc.partial_fit(X.iloc[i:i + chunk_size], y.iloc[i:i + chunk_size])
+        ok_(all(mapping.values is None for mapping in enc._mapping.values()))
+        assert_array_almost_equal(enc.transform(X), expected)
+        # Same result from an iterator of chunks
+        enc = TargetEncoder()
+        enc.fit_from_iterator((X.iloc[i:i + chunk_size], y.iloc[i:i + chunk_size]) for i in range(0, 7, chunk_size))
+        assert_array_almost_equal(enc.transform(X), expected)
+        assert_array_equal(enc._mapping['cat1'].index, pd.Series([-99999, 'a', 'b', 'c']))
+
+    def test_merge(self):
+        X = pd.DataFrame({'cat1': ['a', 'b', np.nan, 'a', 'c', 'b', 'a'], 'cat2': [1, 2, 1, 1, 2, 2, 3]})
+        y = pd.Series([1, 0, 1, 1, 0, 1, 0])
+        expected = TargetEncoder(min_samples=2)
+        expected.fit(X, y)
+        shards = [TargetEncoder(min_samples=2) for _ in range(3)]
+        for i, enc in enumerate(shards):
+            enc.fit(X.iloc[3 * i:3 * i + 3], y.iloc[3 * i:3 * i + 3])
+        merged = TargetEncoder.merge(shards)
+        eq_(merged._imputed, expected._imputed)
+        for col in ['cat1', 'cat2']:
+            assert_array_equal(merged._mapping[col].index, expected._mapping[col].index)
+            assert_array_almost_equal(merged._mapping[col].to_frame(), expected._mapping[col].to_frame())
+        assert_array_almost_equal((shards[0] + shards[1] + shards[2]).transform(X), expected.transform(X))
+        assert_raises(ValueError, TargetEncoder.merge, [shards[0], TargetEncoder()])
+
+    @genty_dataset(
+        memory_mapped=('r',),
+        in_memory=(None,),
+    )
+    def test_save_load_npy_files(self, mmap_mode):
+        X = pd.DataFrame({'cat1': ['a', 'b', np.nan, 'a', 'c', 'b', 'a'], 'cat2': [1, 2, 1, 1, 2, 2, 3]})
+        y = pd.Series([1, 0, 1, 1, 0, 1, 0])
+        enc = TargetEncoder(cols=['cat1', 'cat2'])
+        expected = enc.fit_transform(X, y)
+        path = tempfile.mkdtemp()
+        try:
+            enc.save_as_npy_files(path)
+            loaded = TargetEncoder()
+            loaded.load_from_npy_files(path, mmap_mode=mmap_mode)
+            eq_(loaded.cols, ['cat1', 'cat2'])
+            eq_(loaded._imputed, enc._imputed)
+            for col in ['cat1', 'cat2']:
+                assert_array_equal(loaded._mapping[col].index, enc._mapping[col].index)
+                assert_array_equal(loaded._mapping[col].to_frame(), enc._mapping[col].to_frame())
+            assert_array_equal(loaded.transform(X), expected)
+        finally:
+            shutil.rmtree(path)
+
+    def test_save_load_npy_files_string_keys(self):
+        # Strings are stored as UTF-8 bytes, their size does not depend on the longest one
+        long_key = 'https://example.com/' + 'x' * 10000
+        X = pd.DataFrame({'cat': ['a', 'é', np.nan, long_key, '', 'a']})
+        y = pd.Series([1, 0, 1, 1, 0, 1])
+        enc = TargetEncoder()
+        expected = enc.fit_transform(X, y)
+        path = tempfile.mkdtemp()
+        try:
+            enc.save_as_npy_files(path)
+            ok_(os.path.getsize(os.path.join(path, '0.keys.npy')) < 2 * len(long_key))
+            loaded = TargetEncoder()
+            loaded.load_from_npy_files(path)
+            assert_array_equal(loaded._mapping['cat'].keys, enc._mapping['cat'].keys)
+            assert_array_equal(loaded.transform(X), expected)
+        finally:
+            shutil.rmtree(path)
+
+    @genty_dataset(
+        unbounded=(None, 3),
+        bounded=(1, 1),
+    )
+    def test_load_npy_files_lazy(self, max_resident, n_resident):
+        X = pd.DataFrame({'cat1': ['a', 'b', np.nan, 'a'], 'cat2': [1, 2, 1, 1], 'cat3': ['x', 'y', 'x', 'z']})
+        y = pd.Series([1, 0, 1, 1])
+        enc = TargetEncoder()
+        expected = enc.fit_transform(X, y)
+        path = tempfile.mkdtemp()
+        try:
+            enc.save_as_npy_files(path)
+            loaded = TargetEncoder()
+            loaded.load_from_npy_files(path, lazy=True, max_resident=max_resident)
+            eq_(list(loaded._mapping), ['cat1', 'cat2', 'cat3'])
+            eq_(loaded._mapping.resident, [])
+            # Only used columns are loaded, and they do not need the others
+            assert_array_equal(loaded.transform(X[['cat2']], cols=['cat2']), expected[['cat2']])
+            eq_(loaded._mapping.resident, ['cat2'])
+            assert_array_equal(loaded.transform(X), expected)
+            eq_(loaded._mapping.resident, ['cat1', 'cat2', 'cat3'][-n_resident:])
+            assert_array_equal(loaded.transform(X), expected)
+            eq_(loaded.transform_record(X.iloc[0].to_dict()), expected.iloc[0].to_dict())
+            # Updated mappings are kept in memory
+            loaded.update(X, y)
+            enc.update(X, y)
+            assert_array_almost_equal(loaded.transform(X), enc.transform(X))
+        finally:
+            shutil.rmtree(path)
+
+    @genty_dataset(
+        impute=('impute',),
+        ignore=('ignore',),
+    )
+    def test_transform_record(self, handle_unseen):
+        enc = TargetEncoder(cols=['cat1', 'cat2'], handle_unseen=handle_unseen)
+        X = pd.DataFrame({'cat1': ['a', 'b', np.nan, 'a'], 'cat2': [1, 2, 1, 1], 'num': [1., 2., 3., 4.]})
+        enc.fit(X, pd.Series([1, 0, 1, 1]))
+        Z = pd.DataFrame({'cat1': ['a', np.nan, 'foo', None], 'cat2': [2, 5, 1, 1], 'num': [1., 2., 3., 4.]})
+        expected = enc.transform(Z)
+        records = Z.to_dict('records')
+        for i, record in enumerate(records):
+            result = enc.transform_record(record)
+            eq_(sorted(result), ['cat1', 'cat2', 'num'])
+            assert_array_almost_equal([result['cat1'], result['cat2'], result['num']], expected.iloc[i])
+        assert_array_almost_equal(enc.transform_records(records), expected[['cat1', 'cat2']])
+
+    def test_transform_record_error(self):
+        enc = TargetEncoder(cols=['cat'], handle_unseen='error')
+        enc.fit(pd.DataFrame({'cat': ['a', 'b']}), pd.Series([1, 0]))
+        eq_(enc.transform_record({'cat': 'a'}), {'cat': enc._mapping['cat'].to_frame().loc['a', 'value']})
+        assert_raises(ValueError, enc.transform_record, {'cat': 'foo'})
+        assert_raises(ValueError, enc.transform_records, [{'cat': 'a'}, {'cat': np.nan}])
+
+    def test_transform_error_report(self):
+        enc = TargetEncoder(cols=['cat'], handle_unseen='error')
+        enc.fit(pd.DataFrame({'cat': ['a', 'a', 'b', np.nan]}), pd.Series([1, 1, 0, 1]))
+        # Categories mapped to the same value, and missing values, are not mistaken for unseen ones
+        eq_(enc._mapping['cat'].to_frame().loc['b', 'value'], enc._mapping['cat'].to_frame().loc[-99999, 'value'])
+        enc.transform(pd.DataFrame({'cat': ['b', np.nan, None, 'a']}))
+        with self.assertRaises(ValueError) as context:
+            enc.transform(pd.DataFrame({'cat': ['foo', 'a', 'bar', 'foo', 'b']}))
+        eq_(str(context.exception),
+            "Unseen categories found in `cat` column: 3 rows, 2 categories: 'foo' (2), 'bar' (1).")
+
+    @genty_dataset(
+        k_fold=(3, [0, 0, 0, 1, 1, 2, 2]),
+        leave_one_out=(7, list(range(7))),
+        custom_folds=([1, 0, 1, 0, 1, 0, 1], [1, 0, 1, 0, 1, 0, 1]),
+    )
+    def test_fit_transform_out_of_fold(self, cv, folds):
+        X = pd.DataFrame({'cat1': ['a', 'b', np.nan, 'a', 'c', 'b', 'a'], 'cat2': [1, 2, 1, 1, 2, 2, 1]})
+        y = pd.Series([1, 0, 1, 1, 0, 1, 0])
+        # Expected result: refitting on other folds, for each fold
+        expected = pd.DataFrame(np.nan, index=X.index, columns=X.columns)
+        folds = np.array(folds)
+        for fold in np.unique(folds):
+            enc = TargetEncoder()
+            enc.fit(X[folds != fold], y[folds != fold])
+            expected[folds == fold] = enc.transform(X[folds == fold])
+        enc = TargetEncoder()
+        result = enc.fit_transform(X, y, cv=cv)
+        assert_array_almost_equal(result, expected)
+        # Mapping is learnt on all samples
+        full = TargetEncoder()
+        full.fit(X, y)
+        assert_array_almost_equal(enc._mapping['cat1'].to_frame(), full._mapping['cat1'].to_frame())
+
+    @genty_dataset(
+        single_fold=(1,),
+        too_many_folds=(8,),
+        single_custom_fold=([0] * 7,),
+        wrong_shape=([0, 1],),
+    )
+    def test_fit_transform_out_of_fold_wrong_cv(self, cv):
+        X = pd.DataFrame({'cat': ['a', 'b', np.nan, 'a', 'c', 'b', 'a']})
+        enc = TargetEncoder()
+        assert_raises(ValueError, enc.fit_transform, X, pd.Series([1, 0, 1, 1, 0, 1, 0]), cv=cv)
+        eq_(enc._mapping, {})
+
+    @genty_dataset(
+        categorical=('category', ['b', np.nan, 'foo', 'a']),
+        integer=('int64', [2, 1, 7, -3]),
+    )
+    def test_encode_codes(self, dtype, Z):
+        X = pd.DataFrame({'cat': ['a', 'b', np.nan, 'a', 'c', 'b', 'a']})
+        if dtype == 'int64':
+            X = pd.DataFrame({'cat': [1, 2, 0, 1, 3, 2, 1]})
+        y = pd.Series([1, 0, 1, 1, 0, 1, 0])
+        enc = TargetEncoder()
+        enc.fit(X.astype(dtype), y)
+        ref = TargetEncoder()
+        ref.fit(X.astype(object), y)
+        assert_array_equal(enc._mapping['cat'].index, ref._mapping['cat'].index)
+        assert_array_almost_equal(enc._mapping['cat'].to_frame(), ref._mapping['cat'].to_frame())
+        Z = pd.DataFrame({'cat': pd.Series(Z, dtype=dtype if dtype == 'category' else None)})
+        assert_array_almost_equal(enc.transform(Z), ref.transform(Z.astype(object)))
+
+    def test_load_from_legacy_object_file(self):
+        # Files saved by previous versions hold a DataFrame per column
+        mapping = pd.DataFrame({'mean': [1., 0.5], 'count': [2, 2], 'value': [0.933, 0.567]}, index=['a', 'b'])
+        path = tempfile.mkdtemp()
+        try:
+            with open(path + '/enc.pkl', 'wb') as f:
+                pickle.dump({'cols': ['cat'], 'handle_unseen': 'impute', 'min_samples': 1, 'smoothing': 1,
+                             '_imputed': 0.75, '_mapping': {'cat': mapping}}, f)
+            enc = TargetEncoder()
+            enc.load_from_object_file(path + '/enc.pkl')
+            ok_(isinstance(enc._mapping['cat'], CategoryMapping))
+            result = enc.transform(pd.DataFrame({'cat': ['b', 'foo', 'a']}))
+            assert_array_almost_equal(result, pd.DataFrame([0.567, 0.75, 0.933]))
+        finally:
+            shutil.rmtree(path)
+
+    @genty_dataset(
+        float32=(np.float32, 'impute'),
+        float64=(np.float64, 'ignore'),
+        float16_name=('float16', 'impute'),
+    )
+    def test_dtype(self, dtype, handle_unseen):
+        enc = TargetEncoder(handle_unseen=handle_unseen, dtype=dtype)
+        X = pd.DataFrame({'cat': ['a', 'a', 'b', 'b']})
+        y = pd.Series([1, 1, 0, 1])
+        eq_(enc.fit_transform(X, y)['cat'].dtype, dtype)
+        eq_(enc.fit_transform(X, y, cv=2)['cat'].dtype, dtype)
+        result = enc.transform(pd.DataFrame({'cat': ['a', 'foo']}))['cat']
+        eq_(result.dtype, dtype)
+        assert_array_almost_equal(result, [0.933, 0.75 if handle_unseen == 'impute' else np.nan], decimal=3)
+
+    @genty_dataset(
+        max_categories=({'max_categories': 1}, [0.960, 0.960, 0.960, 0.373, 0.373, 0.373]),
+        min_frequency=({'min_frequency': 2}, [0.960, 0.960, 0.960, 0.373, 0.373, 0.373]),
+        no_limit=({}, [0.960, 0.960, 0.960, 0.667, 0.667, 0.667]),
+    )
+    def test_collapse_rare_categories(self, kwargs, expected):
+        enc = TargetEncoder(**kwargs)
+        X = pd.DataFrame({'cat': ['a', 'a', 'a', 'b', 'c', 'd']})
+        y = pd.Series([1, 1, 1, 0, 1, 0])
+        assert_array_almost_equal(enc.fit_transform(X, y)['cat'], expected, decimal=3)
+        # Statistics of rare categories are summed in the other bucket, unseen categories getting the prior
+        if kwargs:
+            eq_(len(enc._mapping['cat']), 2)
+            assert_array_equal(enc._mapping['cat'].stats[-1], [1, 3])
+            result = enc.transform(pd.DataFrame({'cat': ['c', 'foo']}))['cat']
+            assert_array_almost_equal(result, [0.373, 0.667], decimal=3)
+            eq_(enc.transform_record({'cat': 'c'})['cat'], result[0])
+
+    @genty_dataset(
+        max_categories=({'max_categories': 1},),
+        min_frequency=({'min_frequency': 2},),
+    )
+    def test_collapse_rare_categories_unseen(self, kwargs):
+        # Rare categories are looked up in the other bucket, unseen ones are not
+        X = pd.DataFrame({'cat': ['a', 'a', 'a', 'b', 'c', np.nan]})
+        y = pd.Series([1, 1, 1, 0, 1, 0])
+        Z = pd.DataFrame({'cat': pd.Categorical(['a', 'b', np.nan, 'foo'])})
+        enc = TargetEncoder(handle_unseen='error', **kwargs)
+        enc.fit(X, y)
+        assert_raises(ValueError, enc.transform, Z)
+        assert_raises(ValueError, enc.transform_record, {'cat': 'foo'})
+        enc = TargetEncoder(handle_unseen='ignore', **kwargs)
+        enc.fit(X, y)
+        expected = [0.960, 0.373, 0.373, np.nan]
+        assert_array_almost_equal(enc.transform(Z)['cat'], expected, decimal=3)
+        assert_array_almost_equal(enc.transform(Z.astype(object))['cat'], expected, decimal=3)
+        assert_array_almost_equal(pickle.loads(pickle.dumps(enc)).transform(Z)['cat'], expected, decimal=3)
+        path = tempfile.mkdtemp()
+        try:
+            enc.save_as_npy_files(path)
+            loaded = TargetEncoder()
+            loaded.load_from_npy_files(path)
+            assert_array_almost_equal(loaded.transform(Z)['cat'], expected, decimal=3)
+            # Folded again with new data, rare categories of the saved mapping are still looked up in the other bucket
+            loaded.partial_fit(pd.DataFrame({'cat': ['d', 'a']}), pd.Series([0, 1]))
+            assert_array_almost_equal(loaded.transform(Z)['cat'][[1, 3]], [0.268, np.nan], decimal=3)
+        finally:
+            shutil.rmtree(path)
+
+    @genty_dataset(
+        max_categories=({'max_categories': 1},),
+        min_frequency=({'min_frequency': 2},),
+    )
+    def test_collapse_rare_categories_chunked(self, kwargs):
+        # A category rare in a chunk may be frequent overall: folding happens on statistics of all chunks
+        X1, y1 = pd.DataFrame({'cat': ['x', 'y', 'y', 'y']}), pd.Series([1, 0, 0, 1])
+        X2, y2 = pd.DataFrame({'cat': ['x', 'x', 'x', 'y', 'z']}), pd.Series([1, 1, 0, 0, 1])
+        expected = TargetEncoder(**kwargs)
+        expected.fit(pd.concat([X1, X2]), pd.concat([y1, y2]))
+        shards = [TargetEncoder(**kwargs), TargetEncoder(**kwargs)]
+        shards[0].fit(X1, y1)
+        shards[1].fit(X2, y2)
+        chunked = TargetEncoder(**kwargs)
+        chunked.fit_from_iterator([(X1, y1), (X2, y2)])
+        for enc in [TargetEncoder.merge(shards), chunked]:
+            assert_array_equal(enc._mapping['cat'].index, expected._mapping['cat'].index)
+            assert_array_almost_equal(enc._mapping['cat'].to_frame(), expected._mapping['cat'].to_frame())
+        # Updates are folded again on the next chunk
+        chunked = TargetEncoder(**kwargs)
+        chunked.fit(X1, y1)
+        chunked.update(X2.iloc[:2], y2.iloc[:2])
+        chunked.partial_fit(X2.iloc[2:], y2.iloc[2:])
+        assert_array_almost_equal(chunked.transform(X2), expected.transform(X2))
+
+    def test_hashed_encoding(self):
+        X = pd.DataFrame({'cat': ['a', 'b', np.nan, 'a', 'c', 'b', 'a'], 'num': [1, 2, 1, 1, 2, 2, 3]})
+        y = pd.Series([1, 0, 1, 1, 0, 1, 0])
+        enc = TargetEncoder(n_buckets=1024)
+        result = enc.fit_transform(X, y)
+        # Without collisions, as exact encoding
+        assert_array_almost_equal(result, TargetEncoder().fit_transform(X, y))
+        eq_(len(enc._mapping['cat']), 1024)
+        assert_array_almost_equal(enc.transform(pd.DataFrame({'cat': ['a', 'foo'], 'num': [3, 4]})),
+                                  pd.DataFrame({'cat': [result['cat'][0], 4 / 7], 'num': [result['num'][6], 4 / 7]}))
+        # Categorical columns are hashed as their categories
+        assert_array_almost_equal(enc.transform(X.astype('category')), result)
+        stats = enc.collision_stats()
+        assert_array_equal(stats['occupied'], [4, 3])
+        assert_array_almost_equal(stats['categories'], [4, 3], decimal=2)
+        # Same table from chunks
+        chunked = TargetEncoder(n_buckets=1024)
+        chunked.fit_from_iterator([(X[:3], y[:3]), (X[3:], y[3:])])
+        assert_array_almost_equal(chunked.transform(X), result)
+        assert_raises(ValueError, TargetEncoder, n_buckets=16, max_categories=10)
+
+    def test_hashed_encoding_dtypes(self):
+        # Values are hashed alike whatever the dtype of their column
+        X = pd.DataFrame({'num': [1, 2, 2, 3]})
+        y = pd.Series([1, 0, 1, 0])
+        enc = TargetEncoder(n_buckets=1024)
+        expected = enc.fit_transform(X, y)
+        for values in [[1., 2., 2., 3.], np.array([1, 2, 2, 3], dtype=np.int32), pd.Series([1, 2, 2, 3], dtype=object),
+                       pd.Categorical([1., 2., 2., 3.])]:
+            assert_array_almost_equal(enc.transform(pd.DataFrame({'num': values})), expected)
+        eq_(enc.transform_record({'num': 2.0}), enc.transform_record({'num': 2}))
+        eq_(enc.transform_record({'num': 2.0})['num'], expected['num'][1])
+        # Missing values too, and non integral floats are kept apart
+        missing = [[np.nan], [None], pd.Categorical([np.nan]), pd.array([None], dtype='Int64')]
+        eq_(len(set(enc._hash(pd.Series(values))[0] for values in missing)), 1)
+        ok_(enc._hash(pd.Series([2.5]))[0] != enc._hash(pd.Series([2]))[0])
+
+    @genty_dataset(
+        no_decay=(None, [3, 1, 2, 2]),
+        decay=(0.5, [2, 0.5, 1.5, 2]),
+    )
+    def test_update(self, decay, expected_counts):
+        X1, y1 = pd.DataFrame({'cat': ['a', 'a', 'b', 'c']}), pd.Series([1, 0, 1, 0])
+        X2, y2 = pd.DataFrame({'cat': ['a', 'c', 'd', 'd']}), pd.Series([1, 1, 0, 1])
+        enc = TargetEncoder()
+        enc.fit(X1, y1)
+        value_b = enc._mapping['cat'].values[1]
+        enc.update(X2, y2, decay=decay)
+        mapping = enc._mapping['cat']
+        assert_array_equal(mapping.keys, ['a', 'b', 'c', 'd'])
+        assert_array_equal(mapping.stats[:, 1], expected_counts)
+        total_sum, total_count = mapping.stats.sum(axis=0)
+        eq_(enc._imputed, total_sum / total_count)
+        # Values of touched categories only are derived again
+        expected = enc._values_from_stats(mapping.stats[:, 0], mapping.stats[:, 1], total_sum, total_count)
+        assert_array_almost_equal(mapping.values[[0, 2, 3]], expected[[0, 2, 3]])
+        eq_(mapping.values[1], value_b)
+        if decay is None:
+            full = TargetEncoder()
+            full.fit(pd.concat([X1, X2]), pd.concat([y1, y2]))
+            assert_array_almost_equal(enc.transform(X2), full.transform(X2))
+
+    @genty_dataset(
+        negative=(-1,),
+        zero=(0,),
+        above_one=(1.5,),
+        nan=(np.nan,),
+    )
+    def test_update_wrong_decay(self, decay):
+        X, y = pd.DataFrame({'cat': ['a', 'a', 'b']}), pd.Series([1, 0, 1])
+        enc = TargetEncoder()
+        enc.fit(X, y)
+        expected = enc._mapping['cat'].to_frame()
+        assert_raises(ValueError, enc.update, X, y, decay=decay)
+        # Statistics are left untouched
+        assert_array_equal(enc._mapping['cat'].to_frame(), expected)
+
+    @genty_dataset(
+        multiclass=(False,),
+        out_of_fold=(True,),
+    )
+    def test_multiclass(self, out_of_fold):
+        X = pd.DataFrame({'cat': ['a', 'b', np.nan, 'a', 'c', 'b', 'a'], 'num': [1, 2, 1, 1, 2, 2, 3]})
+        y = pd.Series(['x', 'y', 'z', 'x', 'y', 'y', 'z'])
+        cv = 3 if out_of_fold else None
+        enc = TargetEncoder(multiclass=True)
+        result = enc.fit_transform(X, y, cv=cv)
+        eq_(list(result.columns), ['cat_x', 'cat_y', 'cat_z', 'num_x', 'num_y', 'num_z'])
+        # Same as one encoder per class
+        for label in ['x', 'y', 'z']:
+            expected = TargetEncoder().fit_transform(X, (y == label).astype(int), cv=cv)
+            assert_array_almost_equal(result[['cat_' + label, 'num_' + label]], expected)
+        # One combined mapping per column
+        eq_(enc._mapping['cat'].stat_names, ('sum_x', 'sum_y', 'sum_z', 'count'))
+        eq_(enc._mapping['cat'].values.shape, (4, 3))
+        record = enc.transform_record({'cat': 'foo', 'num': 1})
+        assert_array_almost_equal([record['cat_x'], record['cat_y'], record['cat_z']], [2 / 7, 3 / 7, 2 / 7])
+        assert_array_almost_equal(enc.transform_records([{'cat': 'a', 'num': 1}]),
+                                  enc.transform(X[:1]).values)
+        assert_raises(ValueError, enc.partial_fit, X, pd.Series(['x', 'y', 'w', 'x', 'y', 'y', 'z']))
+
+    def test_multiple_targets(self):
+        X = pd.DataFrame({'cat': ['a', 'b', np.nan, 'a', 'c', 'b', 'a'], 'num': [1, 2, 1, 1, 2, 2, 3]})
+        y = pd.DataFrame({'clicked': [1, 0, 1, 1, 0, 1, 0], 'amount': [2., 0., 1.5, 3., 0., 1., 0.]})
+        enc = TargetEncoder(cols=['cat'])
+        result = enc.fit_transform(X, y)
+        eq_(list(result.columns), ['cat_clicked', 'cat_amount', 'num'])
+        for target in y.columns:
+            expected = TargetEncoder(cols=['cat']).fit_transform(X, y[target])['cat']
+            assert_array_almost_equal(result['cat_' + target], expected)
+        path = tempfile.mkdtemp()
+        try:
+            enc.save_as_npy_files(path)
+            loaded = TargetEncoder()
+            loaded.load_from_npy_files(path)
+            assert_array_almost_equal(loaded.transform(pd.DataFrame({'cat': ['a', 'foo'], 'num': [1, 2]})),
+                                      enc.transform(pd.DataFrame({'cat': ['a', 'foo'], 'num': [1, 2]})))
+        finally:
+            shutil.rmtree(path)
+
+    def test_instrument(self):
+        X = pd.DataFrame({'cat': ['a', 'b', np.nan, 'a'], 'num': [1, 2, 1, 1]})
+        y = pd.Series([1, 0, 1, 1])
+        enc = TargetEncoder()
+        enc.fit(X, y)
+        eq_(enc.stats_, [])
+        received = []
+        enc.instrument(callback=received.append)
+        enc.fit(X, y)
+        phases = pd.DataFrame(enc.stats_)
+        eq_(received, enc.stats_)
+        eq_(set(phases['method']), {'fit'})
+        eq_(sorted(phases[phases['column'] == 'cat']['phase']), ['accumulate', 'factorize'])
+        eq_(phases.set_index('phase').loc['total', 'column'], None)
+        eq_(phases.set_index(['column', 'phase']).loc[('cat', 'factorize'), 'categories'], 3)
+        ok_((phases['seconds'] >= 0).all())
+        # Records are those of the last call
+        enc.transform(pd.DataFrame({'cat': ['a', 'foo', 'bar'], 'num': [1, 1, 1]}))
+        phases = pd.DataFrame(enc.stats_).set_index(['column', 'phase'])
+        eq_(set(phases['method']), {'transform'})
+        eq_(phases.loc[('cat', 'take'), 'unseen'], 2)
+        eq_(phases.loc[('num', 'take'), 'unseen'], 0)
+        eq_(phases.loc[('cat', 'take'), 'bytes'], 24)
+        eq_(phases.loc[(None, 'total'), 'rows'], 3)
+        # Instrumentation is not saved
+        path = tempfile.mkdtemp()
+        try:
+            enc.save_as_object_file(path + '/enc.pkl')
+        finally:
+            shutil.rmtree(path)
+        enc.instrument(enabled=False)
+        enc.transform(X)
+        eq_(enc.stats_, [])
+
+    def test_cache_transforms(self):
+        X = pd.DataFrame({'cat': ['a', 'b', np.nan, 'a'], 'num': [1, 2, 1, 1]})
+        y = pd.Series([1, 0, 1, 1])
+        enc = TargetEncoder()
+        enc.fit(X, y)
+        eq_(enc.transform_cache_info, None)
+        enc.cache_transforms()
+        expected = enc.transform(X)
+        eq_(enc.transform_cache_info['misses'], 2)
+        # Same content, in another DataFrame
+        result = enc.transform(X.copy())
+        assert_array_equal(result, expected)
+        eq_(enc.transform_cache_info['hits'], 2)
+        eq_(enc.transform_cache_info['entries'], 2)
+        # Outputs do not share memory with the cache
+        result['cat'].values[0] = -1.
+        assert_array_equal(enc.transform(X), expected)
+        # Changes of mappings invalidate the cache
+        enc.update(X.iloc[:2], y.iloc[:2])
+        eq_(enc.transform_cache_info['entries'], 0)
+        uncached = copy.deepcopy(enc)
+        uncached.cache_transforms(enabled=False)
+        assert_array_equal(enc.transform(X), uncached.transform(X))
+        enc.fit(X.iloc[1:], y.iloc[1:])
+        eq_(enc.transform_cache_info['entries'], 0)
+        # Least recently used columns are evicted beyond the size bound
+        enc.cache_transforms(max_bytes=40)
+        enc.transform(X)
+        eq_(enc.transform_cache_info['entries'], 1)
+        eq_(enc.transform_cache_info['bytes'], 32)
@@ -2,6 +2,8 @@
 from __future__ import division
 from __future__ import unicode_literals
 
+import shutil
+import tempfile
 import unittest
 
 import numpy as np
@@ -14,6 +16,7 @@ from numpy.testing import assert_array_almost_equal
 from numpy.testing import assert_array_equal
 from numpy.testing import assert_raises
 
+from mlencoders.category_mapping import CategoryMapping
 from mlencoders.weight_of_evidence_encoder import WeightOfEvidenceEncoder
 
 
@@ -39,6 +42,14 @@ class WeightOfEvidenceEncoderTest(unittest.TestCase):
     def test_init_wrong_input(self, handle_unseen):
         assert_raises(ValueError, WeightOfEvidenceEncoder, None, handle_unseen)
 
+    @genty_dataset(
+        int32=(np.int32,),
+        int64=(np.int64,),
+        not_numeric=(object,),
+    )
+    def test_init_wrong_dtype(self, dtype):
+        assert_raises(ValueError, WeightOfEvidenceEncoder, dtype=dtype)
+
     def test_transform_before_fit(self):
         enc = WeightOfEvidenceEncoder()
         assert_raises(ValueError, enc.transform, 1)
@@ -54,9 +65,9 @@ class WeightOfEvidenceEncoderTest(unittest.TestCase):
         assert_array_almost_equal(result, pd.DataFrame(expected), decimal=3)
         eq_(enc._imputed, imputed)
         ok_('cat' in enc._mapping)
-        ok_(isinstance(enc._mapping['cat'], pd.DataFrame))
+        ok_(isinstance(enc._mapping['cat'], CategoryMapping))
         assert_array_equal(enc._mapping['cat'].index, columns)
-        assert_array_equal(enc._mapping['cat'].columns, ['pos', 'count', 'neg', 'value'])
+        assert_array_equal(enc._mapping['cat'].to_frame().columns, ['sum', 'count', 'value'])
 
     @genty_dataset(
         some_input=(['a', 'a', np.nan, 'b'], [1, 1, 0, 1], [0, 0, 0, 0], ['a', 'b']),
@@ -66,10 +77,30 @@ class WeightOfEvidenceEncoderTest(unittest.TestCase):
         result = enc.fit_transform(pd.DataFrame(X, columns=['cat']), pd.Series(y))
         assert_array_almost_equal(result, pd.DataFrame(expected), decimal=3)
         ok_('cat' in enc._mapping)
-        ok_(isinstance(enc._mapping['cat'], pd.DataFrame))
+        ok_(isinstance(enc._mapping['cat'], CategoryMapping))
         eq_(enc._mapping['cat'].index[0], -99999)
         assert_array_equal(enc._mapping['cat'].index[1:], columns)
-        assert_array_equal(enc._mapping['cat'].columns, ['pos', 'count', 'neg', 'value'])
+        assert_array_equal(enc._mapping['cat'].to_frame().columns, ['sum', 'count', 'value'])
+
+    def test_encode_missing_targets(self):
+        X = pd.DataFrame({'cat': ['a', 'a', 'a', 'b', 'b', 'b', 'b']})
+        y = pd.Series([1, 0, np.nan, 1, 0, 0, np.nan])
+        enc = WeightOfEvidenceEncoder()
+        result = enc.fit_transform(X, y)
+        expected = WeightOfEvidenceEncoder()
+        expected.fit(X[y.notna()], y.dropna())
+        assert_array_almost_equal(result, expected.transform(X))
+        assert_array_almost_equal(result['cat'], [0.405] * 3 + [-0.288] * 4, decimal=3)
+
+    @genty_dataset(
+        data_frame=(pd.DataFrame({'y1': [1, 0, 1], 'y2': [0, 0, 1]}),),
+        array=(np.array([[1, 0], [0, 0], [1, 1]]),),
+    )
+    def test_fit_multiple_targets(self, y):
+        X = pd.DataFrame({'cat': ['a', 'a', 'b']})
+        enc = WeightOfEvidenceEncoder()
+        assert_raises(ValueError, enc.fit, X, y)
+        assert_raises(ValueError, enc.partial_fit, X, y)
 
     @genty_dataset(
         impute=(['a', 'a', 'b', 'b'], [1, 1, 0, 1], ['foo', 'a', 'b'], 'impute', [0, 0, -1.099]),
@@ -103,12 +134,12 @@ class WeightOfEvidenceEncoderTest(unittest.TestCase):
         assert_array_almost_equal(result, pd.DataFrame(expected), decimal=2)
         ok_('cat1' in enc._mapping)
         ok_('cat2' in enc._mapping)
-        ok_(isinstance(enc._mapping['cat1'], pd.DataFrame))
-        ok_(isinstance(enc._mapping['cat2'], pd.DataFrame))
+        ok_(isinstance(enc._mapping['cat1'], CategoryMapping))
+        ok_(isinstance(enc._mapping['cat2'], CategoryMapping))
         assert_array_equal(enc._mapping['cat1'].index, ['a', 'b'])
         assert_array_equal(enc._mapping['cat2'].index, ['bar', 'foo'])
-        assert_array_equal(enc._mapping['cat1'].columns, ['pos', 'count', 'neg', 'value'])
-        assert_array_equal(enc._mapping['cat2'].columns, ['pos', 'count', 'neg', 'value'])
+        assert_array_equal(enc._mapping['cat1'].to_frame().columns, ['sum', 'count', 'value'])
+        assert_array_equal(enc._mapping['cat2'].to_frame().columns, ['sum', 'count', 'value'])
 
     @genty_dataset(
         some_input=([['a', 'foo'], ['a', 'bar'], ['b', 'foo']], [1, 0, 1], [[-0.69, 0], [-0.69, 0], [0, 0]]),
@@ -121,9 +152,130 @@ class WeightOfEvidenceEncoderTest(unittest.TestCase):
         assert_array_equal(enc.cols, ['cat1', 'cat2'])
         ok_('cat1' in enc._mapping)
         ok_('cat2' in enc._mapping)
-        ok_(isinstance(enc._mapping['cat1'], pd.DataFrame))
-        ok_(isinstance(enc._mapping['cat2'], pd.DataFrame))
+        ok_(isinstance(enc._mapping['cat1'], CategoryMapping))
+        ok_(isinstance(enc._mapping['cat2'], CategoryMapping))
         assert_array_equal(enc._mapping['cat1'].index, ['a', 'b'])
         assert_array_equal(enc._mapping['cat2'].index, ['bar', 'foo'])
-        assert_array_equal(enc._mapping['cat1'].columns, ['pos', 'count', 'neg', 'value'])
-        assert_array_equal(enc._mapping['cat2'].columns, ['pos', 'count', 'neg', 'value'])
+        assert_array_equal(enc._mapping['cat1'].to_frame().columns, ['sum', 'count', 'value'])
+        assert_array_equal(enc._mapping['cat2'].to_frame().columns, ['sum', 'count', 'value'])
+
+    @genty_dataset(
+        threads_2=(2,),
+        all_processors=(-1,),
+    )
+    def test_n_jobs(self, n_jobs):
+        X = pd.DataFrame({'cat{}'.format(i): list('abcab'[i:] + 'abcab'[:i]) for i in range(5)})
+        y = pd.Series([1, 0, 1, 1, 0])
+        serial = WeightOfEvidenceEncoder().fit_transform(X, y)
+        enc = WeightOfEvidenceEncoder(n_jobs=n_jobs)
+        result = enc.fit_transform(X, y)
+        assert_array_equal(result.columns, serial.columns)
+        assert_array_equal(result, serial)
+
+    @genty_dataset(
+        two_chunks=(2,),
+        unbalanced_chunks=(5,),
+    )
+    def test_partial_fit(self, chunk_size):
+        X = pd.DataFrame({'cat1': ['a', 'b', np.nan, 'a', 'c', 'b', 'a'], 'cat2': [1, 2, 1, 1, 2, 2, 3]})
+        y = pd.Series([1, 0, 1, 1, 0, 1, 0])
+        expected = WeightOfEvidenceEncoder().fit_transform(X, y)
+        enc = WeightOfEvidenceEncoder()
+        for i in range(0, X.shape[0], chunk_size):
+            enc.partial_fit(X.iloc[i:i + chunk_size], y.iloc[i:i + chunk_size])
+        ok_(all(mapping.values is None for mapping in enc._mapping.values()))
+        assert_array_almost_equal(enc.transform(X), expected)
+        # Same result from an iterator of chunks
+        enc = WeightOfEvidenceEncoder()
+        enc.fit_from_iterator((X.iloc[i:i + chunk_size], y.iloc[i:i + chunk_size]) for i in range(0, 7, chunk_size))
+        assert_array_almost_equal(enc.transform(X), expected)
+        assert_array_equal(enc._mapping['cat1'].index, pd.Series([-99999, 'a', 'b', 'c']))
+
+    def test_merge(self):
+        X = pd.DataFrame({'cat1': ['a', 'b', np.nan, 'a', 'c', 'b', 'a'], 'cat2': [1, 2, 1, 1, 2, 2, 3]})
+        y = pd.Series([1, 0, 1, 1, 0, 1, 0])
+        expected = WeightOfEvidenceEncoder(min_samples=2)
+        expected.fit(X, y)
+        shards = [WeightOfEvidenceEncoder(min_samples=2) for _ in range(3)]
+        for i, enc in enumerate(shards):
+            enc.fit(X.iloc[3 * i:3 * i + 3], y.iloc[3 * i:3 * i + 3])
+        merged = WeightOfEvidenceEncoder.merge(shards)
+        eq_(merged._imputed, expected._imputed)
+        for col in ['cat1', 'cat2']:
+            assert_array_equal(merged._mapping[col].index, expected._mapping[col].index)
+            assert_array_almost_equal(merged._mapping[col].to_frame(), expected._mapping[col].to_frame())
+        assert_array_almost_equal((shards[0] + shards[1] + shards[2]).transform(X), expected.transform(X))
+        assert_raises(ValueError, WeightOfEvidenceEncoder.merge, [shards[0], WeightOfEvidenceEncoder()])
+
+    @genty_dataset(
+        memory_mapped=('r',),
+        in_memory=(None,),
+    )
+    def test_save_load_npy_files(self, mmap_mode):
+        X = pd.DataFrame({'cat1': ['a', 'b', np.nan, 'a', 'c', 'b', 'a'], 'cat2': [1, 2, 1, 1, 2, 2, 3]})
+        y = pd.Series([1, 0, 1, 1, 0, 1, 0])
+        enc = WeightOfEvidenceEncoder(cols=['cat1', 'cat2'])
+        expected = enc.fit_transform(X, y)
+        path = tempfile.mkdtemp()
+        try:
+            enc.save_as_npy_files(path)
+            loaded = WeightOfEvidenceEncoder()
+            loaded.load_from_npy_files(path, mmap_mode=mmap_mode)
+            eq_(loaded.cols, ['cat1', 'cat2'])
+            eq_(loaded._imputed, enc._imputed)
+            for col in ['cat1', 'cat2']:
+                assert_array_equal(loaded._mapping[col].index, enc._mapping[col].index)
+                assert_array_equal(loaded._mapping[col].to_frame(), enc._mapping[col].to_frame())
+            assert_array_equal(loaded.transform(X), expected)
+        finally:
+            shutil.rmtree(path)
+
+    @genty_dataset(
+        k_fold=(3, [0, 0, 0, 1, 1, 2, 2]),
+        leave_one_out=(7, list(range(7))),
+        custom_folds=([1, 0, 1, 0, 1, 0, 1], [1, 0, 1, 0, 1, 0, 1]),
+    )
+    def test_fit_transform_out_of_fold(self, cv, folds):
+        X = pd.DataFrame({'cat1': ['a', 'b', np.nan, 'a', 'c', 'b', 'a'], 'cat2': [1, 2, 1, 1, 2, 2, 1]})
+        y = pd.Series([1, 0, 1, 1, 0, 1, 0])
+        # Expected result: refitting on other folds, for each fold
+        expected = pd.DataFrame(np.nan, index=X.index, columns=X.columns)
+        folds = np.array(folds)
+        for fold in np.unique(folds):
+            enc = WeightOfEvidenceEncoder()
+            enc.fit(X[folds != fold], y[folds != fold])
+            expected[folds == fold] = enc.transform(X[folds == fold])
+        enc = WeightOfEvidenceEncoder()
+        result = enc.fit_transform(X, y, cv=cv)
+        assert_array_almost_equal(result, expected)
+        # Mapping is learnt on all samples
+        full = WeightOfEvidenceEncoder()
+        full.fit(X, y)
+        assert_array_almost_equal(enc._mapping['cat1'].to_frame(), full._mapping['cat1'].to_frame())
+
+    def test_information_value(self):
+        X = pd.DataFrame({'cat1': ['a', 'b', 'a', 'a', 'c', 'b', 'c', 'b'], 'cat2': [1, 2, 1, 2, 1, 2, 1, 2]})
+        y = pd.Series([1, 0, 1, 0, 1, 1, 0, 0])
+        enc = WeightOfEvidenceEncoder()
+        enc.fit(X, y)
+        # Expected result: (P(X=X_i | Y=1) - P(X=X_i | Y=0)) * WOE_i summed over categories
+        for col in ['cat1', 'cat2']:
+            pos = y.groupby(X[col]).sum()
+            neg = (1 - y).groupby(X[col]).sum()
+            pos_share, neg_share = pos / y.sum(), neg / (1 - y).sum()
+            woe = np.log(pos_share / neg_share)
+            table = enc.woe_table(col).loc[pos.index]
+            assert_array_equal(table['count'], pos + neg)
+            assert_array_equal(table['pos'], pos)
+            assert_array_almost_equal(table['woe'], woe)
+            assert_array_almost_equal(table['iv'], (pos_share - neg_share) * woe)
+            self.assertAlmostEqual(enc.information_value_[col], ((pos_share - neg_share) * woe).sum())
+        # Same result from chunked fitting
+        chunked = WeightOfEvidenceEncoder()
+        chunked.fit_from_iterator((X[i:i + 3], y[i:i + 3]) for i in range(0, len(X), 3))
+        assert_array_almost_equal(chunked.information_value_, enc.information_value_)
+        assert_array_equal(chunked.information_value_.index, ['cat1', 'cat2'])
+
+    def test_information_value_before_fit(self):
+        with assert_raises(ValueError):
+            WeightOfEvidenceEncoder().information_value_